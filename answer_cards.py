@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import hashlib
+import sqlite3
+import argparse
+import threading
+from memory_graph import MemoryGraph
+from search_answer import AnswerSearching
+
+# 答案只由疾病本身决定的意图，可以按疾病预先生成答案
+CARD_INTENTS = ["query_symptom", "query_cureway", "query_period", "query_rate", "query_checklist",
+                "query_department", "disease_describe"]
+# 答案片段的格式版本，answer_template 或查询结果的结构变化导致片段内容变化时加一
+CARD_FORMAT_VERSION = 2
+
+
+def file_md5(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def build_cards(db_path, data_path=None):
+    """
+    为每个疾病的每个意图预先生成答案片段，写入 sqlite 文件。
+    片段由 answer_template 对该疾病的查询结果生成，按疾病拼接片段即得到多个疾病的答案
+    :param db_path: 输出文件
+    :param data_path: disease.csv 路径
+    :return: 答案片段数
+    """
+    if data_path is None:
+        cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+        data_path = os.path.join(cur_dir, 'data/disease.csv')
+    graph = MemoryGraph.from_file(data_path)
+    searcher = AnswerSearching(graph, workers=1, cache_size=0)
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE cards (intent TEXT, disease TEXT, answer TEXT, PRIMARY KEY (intent, disease)) "
+                 "WITHOUT ROWID")
+    conn.execute("CREATE TABLE aliases (alias TEXT, seq INTEGER, disease TEXT, PRIMARY KEY (alias, seq)) "
+                 "WITHOUT ROWID")
+    conn.execute("INSERT INTO meta VALUES ('source_md5', ?)", (file_md5(data_path),))
+    conn.execute("INSERT INTO meta VALUES ('format_version', ?)", (str(CARD_FORMAT_VERSION),))
+
+    count = 0
+    for intent in CARD_INTENTS:
+        rows = []
+        for name, nodes in graph.diseases.items():
+            row = graph.row(intent, nodes)
+            answer = searcher.answer_template(intent, [row] if row is not None else [])
+            if answer:
+                rows.append((intent, name, answer))
+        conn.executemany("INSERT INTO cards VALUES (?, ?, ?)", rows)
+        count += len(rows)
+    # 别名对应的疾病，与按别名查询图谱时一样按疾病名排序
+    conn.executemany("INSERT INTO aliases VALUES (?, ?, ?)",
+                     ((alias, seq, disease) for alias, diseases in graph.in_edges["ALIAS_IS"].items()
+                      for seq, disease in enumerate(sorted(set(diseases)))))
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+class AnswerCards:
+    def __init__(self, db_path, data_path=None, top_num=10):
+        """
+        读取 build_cards 生成的答案片段，疾病和别名的问题只需按键查找，不再查询图谱
+        :param db_path: build_cards 生成的文件
+        :param data_path: disease.csv 路径，默认为 data/disease.csv；与生成时的文件不一致时不能使用
+        :param top_num: 最多返回的疾病数，与 answer_template 一致
+        """
+        self.db_path = db_path
+        self.top_num = top_num
+        self._local = threading.local()
+        # 旧格式的片段与当前 answer_template 的答案不一致，不能继续使用
+        version = self.connection().execute("SELECT value FROM meta WHERE key='format_version'").fetchone()
+        if version is None or version[0] != str(CARD_FORMAT_VERSION):
+            raise ValueError("答案卡片 {0} 的格式版本为 {1}，当前为 {2}，请运行 python answer_cards.py 重新生成".format(
+                db_path, version[0] if version else "未知", CARD_FORMAT_VERSION))
+        # 数据更新后片段是旧数据的答案，同样不能继续使用
+        if data_path is None:
+            cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+            data_path = os.path.join(cur_dir, 'data/disease.csv')
+        source_md5 = self.connection().execute("SELECT value FROM meta WHERE key='source_md5'").fetchone()
+        if source_md5 is None or source_md5[0] != file_md5(data_path):
+            raise ValueError("答案卡片 {0} 与 {1} 不一致，请运行 python answer_cards.py 重新生成".format(
+                db_path, data_path))
+
+    def connection(self):
+        """
+        每个线程使用自己的只读连接
+        :return: sqlite3.Connection
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect('file:{0}?mode=ro'.format(self.db_path), uri=True)
+            self._local.conn = conn
+        return conn
+
+    def supports(self, intent, label):
+        return intent in CARD_INTENTS and label in ("Disease", "Alias")
+
+    def diseases(self, label, entities):
+        """
+        查询实体对应的疾病名，按出现顺序去重
+        :param label: Disease 或 Alias
+        :param entities: 实体列表
+        :return: [疾病名]
+        """
+        if label == "Disease":
+            return list(dict.fromkeys(entities))
+        conn = self.connection()
+        diseases = []
+        for alias in dict.fromkeys(entities):
+            diseases.extend(row[0] for row in conn.execute(
+                "SELECT disease FROM aliases WHERE alias=? ORDER BY seq", (alias,)))
+        return list(dict.fromkeys(diseases))
+
+    def answer(self, intent, label, entities):
+        """
+        拼接各疾病的答案片段，与 answer_template 一样最多包含 top_num 个疾病
+        :param intent: 查询意图
+        :param label: Disease 或 Alias
+        :param entities: 实体列表
+        :return: str
+        """
+        conn = self.connection()
+        fragments = []
+        for disease in self.diseases(label, entities):
+            row = conn.execute("SELECT answer FROM cards WHERE intent=? AND disease=?", (intent, disease)).fetchone()
+            if row is not None:
+                fragments.append(row[0])
+                if len(fragments) >= self.top_num:
+                    break
+        return ''.join(fragments)
+
+
+if __name__ == "__main__":
+    cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+    parser = argparse.ArgumentParser(description="预先生成各疾病的答案片段")
+    parser.add_argument("--db", default=os.path.join(cur_dir, 'data/answer_cards.db'), help="输出文件")
+    args = parser.parse_args()
+    print("已生成答案片段：", build_cards(args.db))
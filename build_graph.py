@@ -1,15 +1,332 @@
 #!/usr/bin/env python3
 # coding: utf-8
-from py2neo import Graph, Node, Relationship
-import pandas as pd
 import re
 import os
+import csv
+import json
+import time
+import hashlib
+import uuid
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_graph_version(version_path):
+    """
+    读取图谱版本号，每次重建图谱后版本号都会变化
+    :param version_path: 版本文件路径
+    :return: str，文件不存在时为空字符串
+    """
+    try:
+        with open(version_path, 'r', encoding='utf8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def write_graph_version(version_path):
+    """
+    图谱重建后写入新的版本号，AnswerSearching 据此使查询缓存失效
+    :param version_path: 版本文件路径
+    :return: 新版本号
+    """
+    version = uuid.uuid4().hex
+    tmp_path = version_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        f.write(version)
+    os.replace(tmp_path, version_path)
+    return version
+
+
+def write_manifest(manifest_path, fingerprints):
+    """
+    记录本次导入的各疾病指纹
+    :param manifest_path: 指纹文件路径
+    :param fingerprints: disease_fingerprints 的结果
+    :return:
+    """
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        json.dump(fingerprints, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+class Progress:
+    def __init__(self, name, total, interval=5.0):
+        """
+        限频的进度输出，每 interval 秒最多输出一次
+        :param name: 任务名
+        :param total: 总数
+        :param interval: 输出间隔（秒）
+        """
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.start = time.monotonic()
+        self.last = self.start
+
+    def update(self, n=1):
+        self.count += n
+        now = time.monotonic()
+        if now - self.last >= self.interval or self.count >= self.total:
+            self.last = now
+            rate = self.count / max(now - self.start, 1e-6)
+            print("{0}: {1}/{2} ({3:.0f}/s)".format(self.name, self.count, self.total, rate))
+
+
+# 疾病属性，也是导出文件中疾病节点的属性列
+DISEASE_PROPERTIES = ["name", "age", "infection", "insurance", "treatment", "checklist", "period", "rate", "money"]
+# (终点标签, 关系类型, 关系名称)，顺序与 read_disease_file 返回的关系列表一致
+RELATION_TYPES = [("Alias", "ALIAS_IS", "别名"), ("Symptom", "HAS_SYMPTOM", "症状"), ("Part", "PART_IS", "发病部位"),
+                  ("Department", "DEPARTMENT_IS", "所属科室"), ("Complication", "HAS_COMPLICATION", "并发症"),
+                  ("Drug", "HAS_DRUG", "药品")]
+
+
+def parse_disease(data):
+    """
+    解析 disease.csv 的一行
+    :param data: 一行数据
+    :return: (疾病属性, {rel_type: [实体名]})
+    """
+    # cols = ["name", "alias", "part", "age", "infection", "insurance", "department", "checklist", "symptom",
+    #         "complication", "treatment", "drug", "period", "rate", "money"]
+    disease_dict = {}  # 疾病信息
+    edges = {rel_type: [] for _, rel_type, _ in RELATION_TYPES}
+    # 疾病
+    disease = str(data[0]).replace("...", " ").strip()
+    disease_dict["name"] = disease
+    # 别名
+    line = re.sub("[，、；,.;]", " ", str(data[1])) if str(data[1]) else "未知"
+    edges["ALIAS_IS"].extend(line.strip().split())
+    # 部位
+    part_list = str(data[2]).strip().split() if str(data[2]) else "未知"
+    edges["PART_IS"].extend(part_list)
+    # 年龄
+    disease_dict["age"] = str(data[3]).strip()
+    # 传染性
+    disease_dict["infection"] = str(data[4]).strip()
+    # 医保
+    disease_dict["insurance"] = str(data[5]).strip()
+    # 科室
+    edges["DEPARTMENT_IS"].extend(str(data[6]).strip().split())
+    # 检查项
+    disease_dict["checklist"] = str(data[7]).strip()
+    # 症状
+    edges["HAS_SYMPTOM"].extend(str(data[8]).replace("...", " ").strip().split()[:-1])
+    # 并发症
+    complication_list = str(data[9]).strip().split()[:-1] if str(data[9]) else "未知"
+    edges["HAS_COMPLICATION"].extend(complication_list)
+    # 治疗方法
+    disease_dict["treatment"] = str(data[10]).strip()[:-4]
+    # 药品
+    edges["HAS_DRUG"].extend(str(data[11]).replace("...", " ").strip().split()[:-1])
+    # 治愈周期
+    disease_dict["period"] = str(data[12]).strip()
+    # 治愈率
+    disease_dict["rate"] = str(data[13]).strip()
+    # 费用
+    disease_dict["money"] = str(data[14]).strip() if str(data[14]) else "未知"
+    return disease_dict, edges
+
+
+def iter_disease_rows(data_path, chunksize=10000):
+    """
+    分块读取 disease.csv，内存占用只与块大小有关
+    :param data_path: disease.csv 路径
+    :param chunksize: 每块行数
+    :return: 逐行产生 (疾病属性, {rel_type: [实体名]})
+    """
+    # 只读取图谱数据的进程才需要 pandas，不在模块导入时加载
+    import pandas as pd
+
+    # 全部按字符串读取，避免各块分别推断列类型导致与整表读取的结果不同
+    for chunk in pd.read_csv(data_path, encoding='gb18030', dtype=str, chunksize=chunksize):
+        for data in chunk.values:
+            yield parse_disease(data)
+
+
+def iter_disease_chunks(data_path, chunksize=10000):
+    """
+    流式解析 disease.csv，边读边去重，每块只产生之前没有出现过的实体和关系
+    :param data_path: disease.csv 路径
+    :param chunksize: 每块行数
+    :return: 逐块产生 (疾病属性列表, {label: [新实体名]}, {rel_type: [[疾病, 新关系的实体]]})
+    """
+    seen_nodes = {label: set() for label, _, _ in RELATION_TYPES}
+    # 关系以 (疾病, 实体) 元组去重，元组只引用已有的字符串；摘要有碰撞时会误删关系
+    seen_edges = {rel_type: set() for _, rel_type, _ in RELATION_TYPES}
+    infos = []
+    nodes = {label: [] for label, _, _ in RELATION_TYPES}
+    edges = {rel_type: [] for _, rel_type, _ in RELATION_TYPES}
+    for info, row_edges in iter_disease_rows(data_path, chunksize):
+        disease = info['name']
+        infos.append(info)
+        for label, rel_type, _ in RELATION_TYPES:
+            for entity in row_edges[rel_type]:
+                if entity not in seen_nodes[label]:
+                    seen_nodes[label].add(entity)
+                    nodes[label].append(entity)
+                if (disease, entity) not in seen_edges[rel_type]:
+                    seen_edges[rel_type].add((disease, entity))
+                    edges[rel_type].append([disease, entity])
+        if len(infos) >= chunksize:
+            yield infos, nodes, edges
+            infos = []
+            nodes = {label: [] for label, _, _ in RELATION_TYPES}
+            edges = {rel_type: [] for _, rel_type, _ in RELATION_TYPES}
+    if infos:
+        yield infos, nodes, edges
+
+
+def read_disease_file(data_path, chunksize=10000):
+    """
+    读取文件，获得实体，实体关系。关系已去重
+    :param data_path: disease.csv 路径
+    :param chunksize: 每块行数
+    :return:
+    """
+    diseases_infos = []
+    nodes = {label: [] for label, _, _ in RELATION_TYPES}
+    edges = {rel_type: [] for _, rel_type, _ in RELATION_TYPES}
+    for chunk_infos, chunk_nodes, chunk_edges in iter_disease_chunks(data_path, chunksize):
+        diseases_infos.extend(chunk_infos)
+        for label, rel_type, _ in RELATION_TYPES:
+            nodes[label].extend(chunk_nodes[label])
+            edges[rel_type].extend(chunk_edges[rel_type])
+
+    # 疾病实体集合保持与原实现一致，始终为空，疾病节点由 diseases_infos 创建
+    return set(), set(nodes["Symptom"]), set(nodes["Alias"]), set(nodes["Part"]), set(nodes["Department"]), \
+            set(nodes["Complication"]), set(nodes["Drug"]), edges["ALIAS_IS"], edges["HAS_SYMPTOM"], \
+            edges["PART_IS"], edges["DEPARTMENT_IS"], edges["HAS_COMPLICATION"], edges["HAS_DRUG"], diseases_infos
+
+
+def disease_fingerprints(data_path, chunksize=10000):
+    """
+    流式计算每个疾病的指纹：按行的顺序累计同名疾病各行的属性和关系
+    :param data_path: disease.csv 路径
+    :param chunksize: 每块行数
+    :return: {疾病名: 指纹}
+    """
+    hashes = {}
+    for info, row_edges in iter_disease_rows(data_path, chunksize):
+        content = json.dumps([info, row_edges], ensure_ascii=False, sort_keys=True)
+        sha1 = hashes.get(info['name'])
+        if sha1 is None:
+            sha1 = hashes[info['name']] = hashlib.sha1()
+        sha1.update(content.encode('utf8'))
+    return {name: h.hexdigest() for name, h in hashes.items()}
+
+
+def alias_map(data_path, chunksize=10000):
+    """
+    流式构造别名到疾病名的映射，与图谱中的 ALIAS_IS 关系一致
+    :param data_path: disease.csv 路径
+    :param chunksize: 每块行数
+    :return: {别名: [疾病名]}
+    """
+    aliases = {}
+    for info, row_edges in iter_disease_rows(data_path, chunksize):
+        for alias in row_edges["ALIAS_IS"]:
+            diseases = aliases.setdefault(alias, [])
+            if info['name'] not in diseases:
+                diseases.append(info['name'])
+    return aliases
+
+
+def write_rows(writer, rows):
+    """
+    向导入文件追加数据行
+    :param writer: csv.writer
+    :param rows: 数据行
+    :return: 行数
+    """
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def node_rows(label, names):
+    for name in names:
+        yield [name, label]
+
+
+def rel_rows(edges, disease_ids, rel_type, rel_name):
+    for p, q in edges:
+        for start in disease_ids.get(p, []):
+            yield [start, q, rel_type, rel_name]
+
+
+def export_import_files(data_path, out_dir, workers=8, chunksize=10000):
+    """
+    流式读取 disease.csv，导出为 neo4j-admin import 使用的节点和关系文件，不需要连接数据库。
+    疾病节点按文件行号编号（同名疾病与在线导入一样是不同节点），其它节点以名称作为 ID，实体和关系边读边去重。
+    同名疾病可能分布在不同的块中，因此第一遍写节点文件并记录疾病名对应的节点 ID，第二遍写关系文件，
+    内存中只保留该映射和去重集合
+    :param data_path: disease.csv 路径
+    :param out_dir: 输出目录
+    :param workers: 并行写文件的线程数，每块数据的各个文件同时写入
+    :param chunksize: 每次读取的行数
+    :return: neo4j-admin import 命令
+    """
+    headers = {"nodes_Disease.csv": [":ID(Disease)"] + DISEASE_PROPERTIES + [":LABEL"]}
+    for label, _, _ in RELATION_TYPES:
+        headers["nodes_%s.csv" % label] = ["name:ID(%s)" % label, ":LABEL"]
+    for label, rel_type, _ in RELATION_TYPES:
+        headers["rels_%s.csv" % rel_type] = [":START_ID(Disease)", ":END_ID(%s)" % label, ":TYPE", "name"]
+
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    writers = {}
+    counts = dict.fromkeys(headers, 0)
+    try:
+        for name, header in headers.items():
+            files[name] = open(os.path.join(out_dir, name), 'w', encoding='utf8', newline='')
+            writers[name] = csv.writer(files[name])
+            writers[name].writerow(header)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def write_chunk(jobs):
+                futures = [(name, executor.submit(write_rows, writers[name], rows)) for name, rows in jobs]
+                for name, future in futures:
+                    counts[name] += future.result()
+
+            disease_ids = {}
+            for infos, nodes, _ in iter_disease_chunks(data_path, chunksize):
+                disease_rows = []
+                for info in infos:
+                    node_id = "d%d" % (counts["nodes_Disease.csv"] + len(disease_rows))
+                    disease_ids.setdefault(info['name'], []).append(node_id)
+                    disease_rows.append([node_id] + [info[key] for key in DISEASE_PROPERTIES] + ["Disease"])
+                write_chunk([("nodes_Disease.csv", disease_rows)] +
+                            [("nodes_%s.csv" % label, node_rows(label, nodes[label]))
+                             for label, _, _ in RELATION_TYPES])
+
+            for _, _, edges in iter_disease_chunks(data_path, chunksize):
+                write_chunk([("rels_%s.csv" % rel_type, rel_rows(edges[rel_type], disease_ids, rel_type, rel_name))
+                             for _, rel_type, rel_name in RELATION_TYPES])
+    finally:
+        for f in files.values():
+            f.close()
+
+    for name in headers:
+        print(os.path.join(out_dir, name), counts[name])
+    args = ["--nodes=%s" % os.path.join(out_dir, name) for name in headers if name.startswith("nodes_")]
+    args += ["--relationships=%s" % os.path.join(out_dir, name) for name in headers if name.startswith("rels_")]
+    return "neo4j-admin import " + " ".join(args)
 
 
 class MedicalGraph:
     def __init__(self):
+        from py2neo import Graph
+
         cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
-        self.data_path = os.path.join(cur_dir, 'DATA/disease.csv')
+        self.data_path = os.path.join(cur_dir, 'data/disease.csv')
+        self.version_path = os.path.join(cur_dir, 'data/graph_version')
+        # 上次导入的各疾病指纹，增量同步时据此计算差异
+        self.manifest_path = os.path.join(cur_dir, 'data/graph_manifest.json')
         self.graph = Graph("http://localhost:7474", username="neo4j", password="123456789")
 
     def read_file(self):
@@ -17,93 +334,14 @@ class MedicalGraph:
         读取文件，获得实体，实体关系
         :return:
         """
-        # cols = ["name", "alias", "part", "age", "infection", "insurance", "department", "checklist", "symptom",
-        #         "complication", "treatment", "drug", "period", "rate", "money"]
-        # 实体
-        diseases = []  # 疾病
-        aliases = []  # 别名
-        symptoms = []  # 症状
-        parts = []  # 部位
-        departments = []  # 科室
-        complications = []  # 并发症
-        drugs = []  # 药品
-
-        # 疾病的属性：age, infection, insurance, checklist, treatment, period, rate, money
-        diseases_infos = []
-        # 关系
-        disease_to_symptom = []  # 疾病与症状关系
-        disease_to_alias = []  # 疾病与别名关系
-        diseases_to_part = []  # 疾病与部位关系
-        disease_to_department = []  # 疾病与科室关系
-        disease_to_complication = []  # 疾病与并发症关系
-        disease_to_drug = []  # 疾病与药品关系
-
-        all_data = pd.read_csv(self.data_path, encoding='gb18030').loc[:, :].values
-        for data in all_data:
-            disease_dict = {}  # 疾病信息
-            # 疾病
-            disease = str(data[0]).replace("...", " ").strip()
-            disease_dict["name"] = disease
-            # 别名
-            line = re.sub("[，、；,.;]", " ", str(data[1])) if str(data[1]) else "未知"
-            for alias in line.strip().split():
-                aliases.append(alias)
-                disease_to_alias.append([disease, alias])
-            # 部位
-            part_list = str(data[2]).strip().split() if str(data[2]) else "未知"
-            for part in part_list:
-                parts.append(part)
-                diseases_to_part.append([disease, part])
-            # 年龄
-            age = str(data[3]).strip()
-            disease_dict["age"] = age
-            # 传染性
-            infect = str(data[4]).strip()
-            disease_dict["infection"] = infect
-            # 医保
-            insurance = str(data[5]).strip()
-            disease_dict["insurance"] = insurance
-            # 科室
-            department_list = str(data[6]).strip().split()
-            for department in department_list:
-                departments.append(department)
-                disease_to_department.append([disease, department])
-            # 检查项
-            check = str(data[7]).strip()
-            disease_dict["checklist"] = check
-            # 症状
-            symptom_list = str(data[8]).replace("...", " ").strip().split()[:-1]
-            for symptom in symptom_list:
-                symptoms.append(symptom)
-                disease_to_symptom.append([disease, symptom])
-            # 并发症
-            complication_list = str(data[9]).strip().split()[:-1] if str(data[9]) else "未知"
-            for complication in complication_list:
-                complications.append(complication)
-                disease_to_complication.append([disease, complication])
-            # 治疗方法
-            treat = str(data[10]).strip()[:-4]
-            disease_dict["treatment"] = treat
-            # 药品
-            drug_string = str(data[11]).replace("...", " ").strip()
-            for drug in drug_string.split()[:-1]:
-                drugs.append(drug)
-                disease_to_drug.append([disease, drug])
-            # 治愈周期
-            period = str(data[12]).strip()
-            disease_dict["period"] = period
-            # 治愈率
-            rate = str(data[13]).strip()
-            disease_dict["rate"] = rate
-            # 费用
-            money = str(data[14]).strip() if str(data[14]) else "未知"
-            disease_dict["money"] = money
-
-            diseases_infos.append(disease_dict)
-
-        return set(diseases), set(symptoms), set(aliases), set(parts), set(departments), set(complications), \
-                set(drugs), disease_to_alias, disease_to_symptom, diseases_to_part, disease_to_department, \
-                disease_to_complication, disease_to_drug, diseases_infos
+        return read_disease_file(self.data_path)
+
+    def write_version(self):
+        """
+        图谱重建后写入新的版本号，AnswerSearching 据此使查询缓存失效
+        :return: 新版本号
+        """
+        return write_graph_version(self.version_path)
 
     def create_node(self, label, nodes):
         """
@@ -112,6 +350,8 @@ class MedicalGraph:
         :param nodes: 节点
         :return:
         """
+        from py2neo import Node
+
         count = 0
         for node_name in nodes:
             node = Node(label, name=node_name)
@@ -126,6 +366,8 @@ class MedicalGraph:
         :param disease_info: list(Dict)
         :return:
         """
+        from py2neo import Node
+
         count = 0
         for disease_dict in disease_info:
             node = Node("Disease", name=disease_dict['name'], age=disease_dict['age'],
@@ -138,13 +380,14 @@ class MedicalGraph:
             print(count)
         return
 
-    def create_graphNodes(self):
+    def create_graphNodes(self, data=None):
         """
         创建知识图谱实体
+        :param data: read_file 的结果，为空时重新读取文件
         :return:
         """
         disease, symptom, alias, part, department, complication, drug, rel_alias, rel_symptom, rel_part, \
-        rel_department, rel_complication, rel_drug, rel_infos = self.read_file()
+        rel_department, rel_complication, rel_drug, rel_infos = data or self.read_file()
         self.create_diseases_nodes(rel_infos)
         self.create_node("Symptom", symptom)
         self.create_node("Alias", alias)
@@ -155,9 +398,14 @@ class MedicalGraph:
 
         return
 
-    def create_graphRels(self):
+    def create_graphRels(self, data=None):
+        """
+        创建知识图谱实体关系
+        :param data: read_file 的结果，为空时重新读取文件
+        :return:
+        """
         disease, symptom, alias, part, department, complication, drug, rel_alias, rel_symptom, rel_part, \
-        rel_department, rel_complication, rel_drug, rel_infos = self.read_file()
+        rel_department, rel_complication, rel_drug, rel_infos = data or self.read_file()
 
         self.create_relationship("Disease", "Alias", rel_alias, "ALIAS_IS", "别名")
         self.create_relationship("Disease", "Symptom", rel_symptom, "HAS_SYMPTOM", "症状")
@@ -196,8 +444,152 @@ class MedicalGraph:
                 print(e)
         return
 
+    def create_indexes(self):
+        """
+        为各类节点的 name 建立唯一约束；同名疾病会建成多个节点，疾病节点只建索引。
+        建立失败时停止导入：没有索引时按 name 匹配节点创建关系会退化为全表扫描
+        :return:
+        """
+        queries = ["CREATE INDEX ON :Disease(name)"]
+        for label in ["Symptom", "Alias", "Part", "Department", "Complication", "Drug"]:
+            queries.append("CREATE CONSTRAINT ON (n:%s) ASSERT n.name IS UNIQUE" % label)
+        for query in queries:
+            try:
+                self.graph.run(query)
+            except Exception as e:
+                raise RuntimeError("建立索引或约束失败，停止导入：{0}".format(query)) from e
+
+    def run_batches(self, query, rows, batch_size, name):
+        """
+        以 UNWIND $rows 的方式分批执行语句，每批一个事务
+        :param query: cypher 语句
+        :param rows: 参数列表
+        :param batch_size: 每批条数
+        :param name: 进度输出的任务名
+        :return:
+        """
+        progress = Progress(name, len(rows))
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            tx = self.graph.begin()
+            try:
+                tx.run(query, parameters={'rows': batch})
+            except Exception:
+                tx.rollback()
+                raise
+            tx.commit()
+            progress.update(len(batch))
+
+    def bulk_load(self, batch_size=1000, chunksize=10000):
+        """
+        批量导入：先建约束和索引，再流式分块读取文件并分批创建节点和关系。
+        同名疾病可能分布在不同的块中，因此先导入全部节点，再第二次读取文件创建关系
+        :param batch_size: 每批条数
+        :param chunksize: 每次读取的行数
+        :return:
+        """
+        self.create_indexes()
+        for infos, nodes, _ in iter_disease_chunks(self.data_path, chunksize):
+            self.run_batches("UNWIND $rows AS row CREATE (d:Disease) SET d = row", infos, batch_size, "Disease")
+            for label, _, _ in RELATION_TYPES:
+                self.run_batches("UNWIND $rows AS name CREATE (n:%s {name: name})" % label, nodes[label],
+                                 batch_size, label)
+
+        for _, _, edges in iter_disease_chunks(self.data_path, chunksize):
+            for end_node, rel_type, rel_name in RELATION_TYPES:
+                query = "UNWIND $rows AS row MATCH (p:Disease {name: row[0]}), (q:%s {name: row[1]}) " \
+                        "CREATE (p)-[:%s {name: '%s'}]->(q)" % (end_node, rel_type, rel_name)
+                self.run_batches(query, edges[rel_type], batch_size, rel_type)
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf8') as f:
+            return json.load(f)
+
+    def write_manifest(self, fingerprints):
+        """
+        记录本次导入的各疾病指纹
+        :param fingerprints: disease_fingerprints 的结果
+        :return:
+        """
+        write_manifest(self.manifest_path, fingerprints)
+
+    def sync(self, batch_size=1000, chunksize=10000):
+        """
+        增量同步：与上次导入的指纹比较，只删除、重建新增、修改和删除的疾病及其关系。
+        第一遍读取文件计算指纹，之后只保留需要重建的疾病
+        :param batch_size: 每批条数
+        :param chunksize: 每次读取的行数
+        :return: (新增数, 修改数, 删除数)
+        """
+        fingerprints = disease_fingerprints(self.data_path, chunksize)
+        manifest = self.read_manifest()
+        added = [name for name in fingerprints if name not in manifest]
+        changed = [name for name in fingerprints if name in manifest and manifest[name] != fingerprints[name]]
+        removed = [name for name in manifest if name not in fingerprints]
+        print("新增：{0}，修改：{1}，删除：{2}".format(len(added), len(changed), len(removed)))
+
+        # 修改的疾病先删除再重建；新增的疾病也先删除，避免与已有的同名节点重复
+        self.run_batches("UNWIND $rows AS name MATCH (d:Disease {name: name}) DETACH DELETE d",
+                         added + changed + removed, batch_size, "删除疾病")
+        upserts = set(added + changed)
+        if upserts:
+            for infos, _, _ in iter_disease_chunks(self.data_path, chunksize):
+                self.run_batches("UNWIND $rows AS row CREATE (d:Disease) SET d = row",
+                                 [info for info in infos if info['name'] in upserts], batch_size, "Disease")
+            for _, _, edges in iter_disease_chunks(self.data_path, chunksize):
+                for end_node, rel_type, rel_name in RELATION_TYPES:
+                    query = "UNWIND $rows AS row MERGE (q:%s {name: row[1]}) WITH row, q " \
+                            "MATCH (p:Disease {name: row[0]}) CREATE (p)-[:%s {name: '%s'}]->(q)" % (
+                                end_node, rel_type, rel_name)
+                    self.run_batches(query, [edge for edge in edges[rel_type] if edge[0] in upserts],
+                                     batch_size, rel_type)
+
+        # 清理不再与任何疾病相连的实体节点
+        if changed or removed:
+            for end_node, _, _ in RELATION_TYPES:
+                self.graph.run("MATCH (n:%s) WHERE NOT (n)<--() DELETE n" % end_node)
+
+        self.write_manifest(fingerprints)
+        return len(added), len(changed), len(removed)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建医疗知识图谱")
+    parser.add_argument("--bulk", action="store_true", help="建立索引后分批导入")
+    parser.add_argument("--batch-size", type=int, default=1000, help="批量导入时每批的条数")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="流式读取 disease.csv 时每块的行数")
+    parser.add_argument("--sync", action="store_true", help="与上次导入比较，只同步有变化的疾病")
+    parser.add_argument("--export", metavar="DIR", help="不连接数据库，导出 neo4j-admin import 使用的文件到 DIR")
+    parser.add_argument("--write-version", action="store_true",
+                        help="只写入新的图谱版本号，用 neo4j-admin import 导入完成后运行")
+    args = parser.parse_args()
+
+    cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+    if args.export:
+        data_path = os.path.join(cur_dir, 'data/disease.csv')
+        command = export_import_files(data_path, args.export, chunksize=args.chunk_size)
+        # 导入是全量重建，指纹文件按导出的数据写入，之后的 --sync 以此为基准；
+        # 版本号要在导入完成后再写，否则导入前旧图谱的查询结果会以新版本号留在缓存中
+        write_manifest(os.path.join(cur_dir, 'data/graph_manifest.json'),
+                       disease_fingerprints(data_path, args.chunk_size))
+        print(command)
+        print("导入完成后运行：python build_graph.py --write-version")
+        raise SystemExit
+    if args.write_version:
+        print(write_graph_version(os.path.join(cur_dir, 'data/graph_version')))
+        raise SystemExit
+
     handler = MedicalGraph()
-    handler.create_graphNodes()
-    handler.create_graphRels()
+    if args.sync:
+        handler.sync(args.batch_size, args.chunk_size)
+    else:
+        if args.bulk:
+            handler.bulk_load(args.batch_size, args.chunk_size)
+        else:
+            data = handler.read_file()
+            handler.create_graphNodes(data)
+            handler.create_graphRels(data)
+        handler.write_manifest(disease_fingerprints(handler.data_path, args.chunk_size))
+    handler.write_version()
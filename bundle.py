@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import pickle
+import hashlib
+import argparse
+import threading
+import subprocess
+import numpy as np
+
+# 文件格式版本，格式或各段内容的含义变化时加一
+BUNDLE_VERSION = 2
+MAGIC = b'KBQABNDL'
+ALIGN = 64
+# 冷启动时间预算（秒）：新进程中导入并构造 EntityExtractor，以及回答第一个问题
+STARTUP_BUDGET = 0.5
+FIRST_QUESTION_BUDGET = 0.1
+
+
+def file_md5(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def write_bundle(path, sections, paths, versions):
+    """
+    将各段数据写入一个文件。文件头为 json 索引，各段按 64 字节对齐，数组段可以直接从 mmap 读取
+    :param path: 输出文件
+    :param sections: {段名: (类型, 数据)}，类型为 array / bytes / lines / pickle / json
+    :param paths: {源文件名: 路径}，记录各文件的 md5，用于判断 bundle 是否过期
+    :param versions: {名称: 版本号}，如依赖库版本
+    :return: 文件大小
+    """
+    sources = {name: file_md5(p) for name, p in paths.items()}
+    sources.update(versions)
+    index = {}
+    blobs = []
+    offset = 0
+    for name, (kind, value) in sections.items():
+        meta = {"kind": kind}
+        if kind == "array":
+            value = np.ascontiguousarray(value)
+            meta["dtype"] = value.dtype.str
+            meta["shape"] = list(value.shape)
+            blob = value.tobytes()
+        elif kind == "bytes":
+            blob = bytes(value)
+        elif kind == "lines":
+            blob = '\n'.join(value).encode('utf8')
+            meta["count"] = len(value)
+        elif kind == "pickle":
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        elif kind == "json":
+            blob = json.dumps(value, ensure_ascii=False).encode('utf8')
+        else:
+            raise ValueError("未知的段类型：{0}".format(kind))
+        meta["offset"] = offset
+        meta["length"] = len(blob)
+        index[name] = meta
+        blobs.append(blob)
+        offset += len(blob) + (-len(blob)) % ALIGN
+
+    header = json.dumps({"version": BUNDLE_VERSION, "sources": sources, "sections": index},
+                        ensure_ascii=False).encode('utf8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        f.write(b'\0' * ((-f.tell()) % ALIGN))
+        for blob in blobs:
+            f.write(blob)
+            f.write(b'\0' * ((-len(blob)) % ALIGN))
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+class Bundle:
+    def __init__(self, path):
+        """
+        以 mmap 方式打开 write_bundle 生成的文件，各段在第一次使用时才解码
+        :param path: bundle 文件
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError("{0} 不是 bundle 文件".format(path))
+        header_end = len(MAGIC) + 8 + int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], 'little')
+        header = json.loads(self._mmap[len(MAGIC) + 8:header_end].decode('utf8'))
+        self.version = header["version"]
+        self.sources = header["sources"]
+        self.sections = header["sections"]
+        self._data_offset = header_end + (-header_end) % ALIGN
+        self._view = memoryview(self._mmap)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def is_stale(self, paths, versions):
+        """
+        文件格式版本不同，或源文件、依赖版本与生成时不一致时视为过期；部署时不存在的源文件不参与比较
+        :param paths: {源文件名: 路径}
+        :param versions: {名称: 版本号}
+        :return: bool
+        """
+        if self.version != BUNDLE_VERSION:
+            return True
+        for name, path in paths.items():
+            if os.path.exists(path) and self.sources.get(name) != file_md5(path):
+                return True
+        return any(self.sources.get(name) != value for name, value in versions.items())
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def raw(self, name):
+        """
+        段的原始数据，不复制
+        :param name: 段名
+        :return: memoryview
+        """
+        meta = self.sections[name]
+        start = self._data_offset + meta["offset"]
+        return self._view[start:start + meta["length"]]
+
+    def get(self, name):
+        """
+        读取一段数据：数组段直接映射文件内容（只读），其它段解码后缓存
+        :param name: 段名
+        :return:
+        """
+        value = self._cache.get(name)
+        if value is not None:
+            return value
+        with self._lock:
+            value = self._cache.get(name)
+            if value is None:
+                value = self._decode(name)
+                self._cache[name] = value
+        return value
+
+    def _decode(self, name):
+        meta = self.sections[name]
+        kind = meta["kind"]
+        data = self.raw(name)
+        if kind == "array":
+            return np.frombuffer(data, dtype=np.dtype(meta["dtype"])).reshape(meta["shape"])
+        if kind == "bytes":
+            return data
+        if kind == "lines":
+            return str(data, 'utf8').split('\n') if meta["count"] else []
+        if kind == "pickle":
+            return pickle.loads(data)
+        return json.loads(str(data, 'utf8'))
+
+
+class FreqTable:
+    def __init__(self, keys, starts, freqs, slots):
+        """
+        只读的 词 -> 词频 哈希表，代替 jieba 分词器的 FREQ 字典。数据可以直接映射 bundle 文件，
+        启动时不需要反序列化几十万个词
+        :param keys: 所有词 utf8 编码后依次拼接
+        :param starts: int64，第 i 个词在 keys 中的起止位置为 starts[i], starts[i + 1]
+        :param freqs: int64，词频
+        :param slots: int32，开放寻址表，值为词的下标，-1 表示空位；长度为 2 的幂
+        """
+        self._keys = memoryview(keys).cast('B')
+        self._starts = memoryview(np.ascontiguousarray(starts, dtype=np.int64)).cast('B').cast('q')
+        self._freqs = memoryview(np.ascontiguousarray(freqs, dtype=np.int64)).cast('B').cast('q')
+        self._slots = memoryview(np.ascontiguousarray(slots, dtype=np.int32)).cast('B').cast('i')
+        self._mask = len(self._slots) - 1
+
+    @staticmethod
+    def build(freq):
+        """
+        由词频字典构造哈希表数据
+        :param freq: {词: 词频}
+        :return: (keys, starts, freqs, slots)
+        """
+        words = [word.encode('utf8') for word in freq]
+        size = 1
+        while size < 2 * len(words):
+            size *= 2
+        slots = np.full(size, -1, dtype=np.int32)
+        mask = size - 1
+        for i, key in enumerate(words):
+            slot = zlib.crc32(key) & mask
+            while slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            slots[slot] = i
+        starts = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum([len(key) for key in words], out=starts[1:])
+        freqs = np.array(list(freq.values()), dtype=np.int64)
+        return b''.join(words), starts, freqs, slots
+
+    def _find(self, word):
+        key = word.encode('utf8')
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            i = self._slots[slot]
+            if i < 0:
+                return -1
+            if self._keys[self._starts[i]:self._starts[i + 1]] == key:
+                return i
+            slot = (slot + 1) & self._mask
+
+    def get(self, word, default=None):
+        i = self._find(word)
+        return default if i < 0 else self._freqs[i]
+
+    def __getitem__(self, word):
+        i = self._find(word)
+        if i < 0:
+            raise KeyError(word)
+        return self._freqs[i]
+
+    def __contains__(self, word):
+        return self._find(word) >= 0
+
+    def __len__(self):
+        return len(self._freqs)
+
+
+def measure_startup(question="乙肝怎么治疗"):
+    """
+    在新进程中测量冷启动时间：导入并构造 EntityExtractor，以及抽取第一个问题
+    :param question: 第一个问题
+    :return: {"startup", "first_question"}（秒）
+    """
+    cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+    code = "import time, json\n" \
+           "start = time.perf_counter()\n" \
+           "from entity_extractor import EntityExtractor\n" \
+           "extractor = EntityExtractor()\n" \
+           "ready = time.perf_counter()\n" \
+           "extractor.extractor({0!r})\n" \
+           "done = time.perf_counter()\n" \
+           "print(json.dumps({{'startup': ready - start, 'first_question': done - ready}}))\n".format(question)
+    output = subprocess.run([sys.executable, '-c', code], cwd=cur_dir, check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建或检查 EntityExtractor 的启动 bundle")
+    parser.add_argument("command", choices=["build", "check"],
+                        help="build：从源文件生成 bundle；check：测量冷启动时间并与预算比较")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from entity_extractor import EntityExtractor
+        extractor = EntityExtractor(use_bundle=False)
+        start = time.perf_counter()
+        size = extractor.build_bundle()
+        print("已生成 {0}，{1:.1f} MB，用时 {2:.1f}s".format(extractor.bundle_path, size / 1024 / 1024,
+                                                       time.perf_counter() - start))
+    else:
+        timing = measure_startup()
+        print("启动：{0:.3f}s（预算 {1}s），第一个问题：{2:.3f}s（预算 {3}s）".format(
+            timing['startup'], STARTUP_BUDGET, timing['first_question'], FIRST_QUESTION_BUDGET))
+        if timing['startup'] > STARTUP_BUDGET or timing['first_question'] > FIRST_QUESTION_BUDGET:
+            raise SystemExit(1)
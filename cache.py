@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize=10000, ttl=None):
+        """
+        线程安全的 LRU 缓存，可设置过期时间，并统计命中、未命中和淘汰次数
+        :param maxsize: 最大条数
+        :param ttl: 默认过期时间（秒），None 表示不过期
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (value, 过期时间戳)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        读取缓存，过期的条目视为未命中
+        :param key:
+        :param default: 未命中时的返回值
+        :return:
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] is not None and item[1] <= time.time():
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        """
+        写入缓存，超过最大条数时淘汰最久未使用的条目
+        :param key:
+        :param value:
+        :param ttl: 本条目的过期时间（秒），None 时使用默认值
+        :return:
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expire = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._data[key] = (value, expire)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def save(self, path):
+        """
+        将未过期的条目写入 json 文件，键和值需要是可以 json 序列化的类型
+        :param path: 文件路径
+        :return:
+        """
+        now = time.time()
+        with self._lock:
+            items = [[key, value, expire] for key, (value, expire) in self._data.items()
+                     if expire is None or expire > now]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        从 save 写入的文件恢复缓存，跳过已过期的条目
+        :param path: 文件路径
+        :return: 恢复的条数
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r', encoding='utf8') as f:
+            items = json.load(f)
+        now = time.time()
+        count = 0
+        with self._lock:
+            for key, value, expire in items:
+                if expire is not None and expire <= now:
+                    continue
+                self._data[key] = (value, expire)
+                self._data.move_to_end(key)
+                count += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return count
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """
+        :return: {"size", "hits", "misses", "evictions"}
+        """
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from entity_extractor import EntityExtractor
+
+TEMPLATES = ['{}怎么治疗', '{}有什么症状', '得了{}要做哪些检查', '{}和{}是什么病', '{}多久能好', '{}挂什么科',
+             '我最近{}，是怎么回事', '请问一下{}能治好吗', '{}的治愈率有多少', '{}是什么病']
+FIXED_QUESTIONS = ['乙肝怎么治疗', '头疼怎么办', '感冒了吃什么药', '肚子胀气怎么回事', '慢性咽炎', '今天天气不错']
+
+
+def make_questions(extractor, count, seed=0):
+    """
+    由实体词表和问题模板随机生成问题；打乱实体字序的问题会走模糊匹配
+    :param extractor: EntityExtractor
+    :param count: 问题数
+    :param seed: 随机种子
+    :return: [str]
+    """
+    rng = random.Random(seed)
+    entities = [entity for _, words in extractor.entity_types() for entity in words]
+    questions = list(FIXED_QUESTIONS)
+    while len(questions) < count:
+        template = rng.choice(TEMPLATES)
+        words = [rng.choice(entities) for _ in range(template.count('{}'))]
+        if rng.random() < 0.1:
+            words = [''.join(rng.sample(word, len(word))) for word in words]
+        questions.append(template.format(*words))
+    return questions
+
+
+def check_concurrency(extractor, questions, threads=16, rounds=3, batch_size=32):
+    """
+    同一个 EntityExtractor 实例在线程池中并发调用 extractor 和 extract_batch，
+    结果必须与顺序调用完全相同
+    :param extractor: EntityExtractor
+    :param questions: [str]
+    :param threads: 线程数
+    :param rounds: 并发执行的轮数
+    :param batch_size: extract_batch 每批的问题数
+    :return: 不一致的次数
+    """
+    expected = [extractor.extractor(question) for question in questions]
+    batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+    expected_batches = [expected[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+
+    errors = 0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for n in range(rounds):
+            # 每轮打乱提交顺序，使不同问题交错执行
+            order = list(range(len(questions)))
+            random.Random(n).shuffle(order)
+            results = dict(zip(order, executor.map(lambda i: extractor.extractor(questions[i]), order)))
+            for i, question in enumerate(questions):
+                if results[i] != expected[i]:
+                    errors += 1
+                    print("extractor 结果不一致：", question, results[i], expected[i])
+
+            for batch, result, want in zip(batches, executor.map(extractor.extract_batch, batches),
+                                           expected_batches):
+                for question, got, ref in zip(batch, result, want):
+                    if got != ref:
+                        errors += 1
+                        print("extract_batch 结果不一致：", question, got, ref)
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查 EntityExtractor 并发调用与顺序调用的结果是否一致")
+    parser.add_argument("--questions", type=int, default=2000, help="问题数")
+    parser.add_argument("--threads", type=int, default=16, help="线程数")
+    parser.add_argument("--rounds", type=int, default=3, help="并发执行的轮数")
+    args = parser.parse_args()
+
+    # 不缓存分词结果，使每次调用都真正执行分词
+    extractor = EntityExtractor(segment_cache_size=0)
+    questions = make_questions(extractor, args.questions)
+    errors = check_concurrency(extractor, questions, args.threads, args.rounds)
+    print("{0} 个问题，{1} 个线程，{2} 轮：{3}".format(len(questions), args.threads, args.rounds,
+                                                 "结果一致" if not errors else "{0} 处不一致".format(errors)))
+    if errors:
+        raise SystemExit(1)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import hashlib
+import pickle
+import numpy as np
+from scipy import sparse
+from build_graph import iter_disease_rows
+
+# 参与诊断的关系：疾病的症状和并发症
+DIAGNOSIS_RELATIONS = ["HAS_SYMPTOM", "HAS_COMPLICATION"]
+
+
+class DiagnosisEngine:
+    def __init__(self, diseases, terms, incidence):
+        """
+        由症状推断疾病：疾病 × (症状 ∪ 并发症) 的稀疏关联矩阵按 IDF 加权并按行归一化，
+        一次稀疏矩阵向量乘法即可得到所有疾病与问题的余弦相似度
+        :param diseases: 疾病名列表，对应矩阵的行
+        :param terms: 症状和并发症名列表，对应矩阵的列
+        :param incidence: scipy.sparse 0/1 关联矩阵
+        """
+        self.diseases = diseases
+        self.terms = {term: i for i, term in enumerate(terms)}
+        incidence = sparse.csr_matrix(incidence, dtype=np.float64)
+        # 关联的疾病越少，症状的区分度越高
+        df = np.asarray(incidence.sum(axis=0)).ravel()
+        self.idf = np.log((1 + len(diseases)) / (1 + df)) + 1
+        weights = incidence.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        self.weights = sparse.diags(1 / norms).dot(weights).tocsr()
+        # from_file 构造时记录数据文件，图谱更新后由 reload 重新读取
+        self.data_path = None
+        self.cache_dir = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        :param rows: iter_disease_rows 的结果
+        :return: DiagnosisEngine
+        """
+        diseases = {}
+        terms = {}
+        entries = set()
+        for info, row_edges in rows:
+            row = diseases.setdefault(info['name'], len(diseases))
+            for rel_type in DIAGNOSIS_RELATIONS:
+                for term in row_edges[rel_type]:
+                    entries.add((row, terms.setdefault(term, len(terms))))
+        entries = np.array(sorted(entries), dtype=np.int64).reshape(-1, 2)
+        incidence = sparse.csr_matrix((np.ones(len(entries)), (entries[:, 0], entries[:, 1])),
+                                      shape=(len(diseases), len(terms)))
+        return cls(list(diseases), list(terms), incidence)
+
+    @classmethod
+    def from_file(cls, data_path=None, cache_dir=None):
+        """
+        从 disease.csv 构造，disease.csv 未变化时直接读取磁盘缓存
+        :param data_path: disease.csv 路径
+        :param cache_dir: 缓存目录
+        :return: DiagnosisEngine
+        """
+        cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+        data_path = data_path or os.path.join(cur_dir, 'data/disease.csv')
+        cache_dir = cache_dir or os.path.join(cur_dir, 'cache')
+        with open(data_path, 'rb') as f:
+            key = hashlib.md5(f.read()).hexdigest()
+        cache_path = os.path.join(cache_dir, 'diagnosis_{0}.pkl'.format(key))
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                engine = pickle.load(f)
+        else:
+            engine = cls.from_rows(iter_disease_rows(data_path))
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        engine.data_path = data_path
+        engine.cache_dir = cache_dir
+        return engine
+
+    def reload(self):
+        """
+        图谱重建或同步后重新读取数据文件；数据文件未变化时读取的是同一份磁盘缓存
+        :return: DiagnosisEngine，不是由 from_file 构造时返回自身
+        """
+        if getattr(self, 'data_path', None) is None:
+            return self
+        return DiagnosisEngine.from_file(self.data_path, self.cache_dir)
+
+    def supports(self, intent, label):
+        return intent == "query_disease" and label in ("Symptom", "Complication")
+
+    def rank(self, symptoms, top_k=10):
+        """
+        为所有疾病打分并取分数最高的 top_k 个。分数为问题与疾病的 IDF 加权向量的余弦相似度，
+        在 0 到 1 之间：疾病包含的问题症状越多、其它症状越少，分数越高
+        :param symptoms: 症状或并发症名列表，不在图谱中的忽略
+        :param top_k: 返回的疾病数
+        :return: [(疾病名, 分数)]，按分数降序，同分按疾病名排序
+        """
+        cols = sorted({self.terms[s] for s in symptoms if s in self.terms})
+        if not cols:
+            return []
+        query = np.zeros(len(self.terms))
+        query[cols] = self.idf[cols]
+        scores = self.weights.dot(query / np.linalg.norm(query))
+
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        # 与第 k 名同分的疾病都参与排序，保证同分时按疾病名取舍
+        top = np.flatnonzero(scores >= scores[top].min())
+        ranked = sorted(((self.diseases[i], float(scores[i])) for i in top), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+    def search(self, sql_):
+        """
+        与查询后端相同的接口，返回 query_disease 的结果行
+        :param sql_: {"intention", "label", "entities", "limit", ...}
+        :return: [{"d.name", "score"}]
+        """
+        return [{'d.name': name, 'score': score}
+                for name, score in self.rank(sql_['entities'], sql_.get('limit', 10))]
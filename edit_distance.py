@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import numpy as np
+
+# numpy 批量计算时位向量使用 uint64，模式串长度超过该值时退回 Python 大整数
+WORD_BITS = 63
+
+
+def pattern_masks(pattern):
+    """
+    构造模式串中每个字符出现位置的位掩码
+    :param pattern: str
+    :return: {char: int}
+    """
+    peq = {}
+    for i, ch in enumerate(pattern):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    return peq
+
+
+def edit_distance(s1, s2, max_dist=None, peq=None):
+    """
+    Myers 位并行算法计算编辑距离，结果与 DP 方法相同
+    :param s1: 模式串
+    :param s2: 文本串
+    :param max_dist: 距离上限，确定超过上限时提前返回 max_dist + 1
+    :param peq: s1 的位掩码，批量计算时复用
+    :return: int
+    """
+    m = len(s1)
+    n = len(s2)
+    if max_dist is not None and abs(m - n) > max_dist:
+        return max_dist + 1
+    if m == 0:
+        return n
+    if peq is None:
+        peq = pattern_masks(s1)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    for j, ch in enumerate(s2):
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+        # 剩余每个字符最多使距离减少 1
+        if max_dist is not None and score - (n - j - 1) > max_dist:
+            return max_dist + 1
+    return score
+
+
+def batch_distance(word, candidates, max_dist=None):
+    """
+    计算一个词与一组候选词的编辑距离，所有候选在 numpy 数组上同步推进
+    :param word: str
+    :param candidates: [str]
+    :param max_dist: 距离上限，int 或与 candidates 等长的数组；超过上限的候选返回 max_dist + 1
+    :return: np.ndarray(int64)
+    """
+    count = len(candidates)
+    if max_dist is not None:
+        max_dist = np.broadcast_to(np.asarray(max_dist, dtype=np.int64), (count,))
+    m = len(word)
+    if m == 0 or m > WORD_BITS or count == 0:
+        peq = pattern_masks(word)
+        return np.array([edit_distance(word, c, None if max_dist is None else int(max_dist[i]), peq)
+                         for i, c in enumerate(candidates)], dtype=np.int64)
+
+    lens = np.array([len(c) for c in candidates], dtype=np.int64)
+    width = int(lens.max())
+    # 每个候选每个位置上的字符在 word 中的位掩码
+    peq = pattern_masks(word)
+    eqs = np.zeros((count, width), dtype=np.uint64)
+    for i, c in enumerate(candidates):
+        eqs[i, :len(c)] = [peq.get(ch, 0) for ch in c]
+
+    mask = np.uint64((1 << m) - 1)
+    high = np.uint64(1 << (m - 1))
+    one = np.uint64(1)
+    pv = np.full(count, mask, dtype=np.uint64)
+    mv = np.zeros(count, dtype=np.uint64)
+    score = np.full(count, m, dtype=np.int64)
+    active = np.ones(count, dtype=bool)
+    if max_dist is not None:
+        active &= np.abs(lens - m) <= max_dist
+
+    for j in range(width):
+        live = active & (j < lens)
+        if not live.any():
+            break
+        eq = eqs[:, j]
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        score += live & ((ph & high) != 0)
+        score -= live & ((ph & high) == 0) & ((mh & high) != 0)
+        ph = ((ph << one) | one) & mask
+        mh = (mh << one) & mask
+        new_pv = (mh | ~(xv | ph)) & mask
+        new_mv = ph & xv
+        pv = np.where(live, new_pv, pv)
+        mv = np.where(live, new_mv, mv)
+        if max_dist is not None:
+            active &= score - np.maximum(lens - j - 1, 0) <= max_dist
+
+    if max_dist is not None:
+        score = np.where(active, score, max_dist + 1)
+    return score
@@ -1,45 +1,52 @@
 #!/usr/bin/env python3
 # coding: utf-8
 import os
+import json
+import hashlib
+import pickle
+import threading
 import ahocorasick
-from sklearn.externals import joblib
 import jieba
 import numpy as np
+from word_vectors import WordVectors
+from fuzzy_matcher import FuzzyMatcher
+from segmenter import Segmenter, get_tokenizer, frozen_tokenizer
+from intent_classifier import IntentClassifier
+from bundle import Bundle, FreqTable, write_bundle
+from entity_table import EntityTable
 
 
 class EntityExtractor:
-    def __init__(self):
+    def __init__(self, segment_cache_size=1024, bundle_path=None, use_bundle=True):
+        """
+        实体与意图抽取。初始化后所有模型只读，每次调用的结果都是新建的对象，
+        同一个实例可以被多个线程共享
+        :param segment_cache_size: 分词结果的 LRU 缓存条数，0 表示不缓存
+        :param bundle_path: python bundle.py build 生成的启动文件，默认为 cache/extractor.bundle
+        :param use_bundle: 是否从 bundle 启动；bundle 不存在或已过期时从源文件加载
+        """
         cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
         # 路径
         self.vocab_path = os.path.join(cur_dir, 'data/vocab.txt')
         self.stopwords_path =os.path.join(cur_dir, 'data/stop_words.utf8')
         self.word2vec_path = os.path.join(cur_dir, 'data/merge_sgns_bigram_char300.txt')
+        # 由 word2vec_path 转换得到的紧凑词向量存储，首次相似度计算时才加载
+        self.word_vectors = WordVectors(os.path.join(cur_dir, 'data/word_vectors'))
         # self.same_words_path = os.path.join(cur_dir, 'DATA/同义词林.txt')
-        self.stopwords = [w.strip() for w in open(self.stopwords_path, 'r', encoding='utf8') if w.strip()]
 
         # 意图分类模型文件
         self.tfidf_path = os.path.join(cur_dir, 'model/tfidf_model.m')
         self.nb_path = os.path.join(cur_dir, 'model/intent_reg_model.m')  #朴素贝叶斯模型
-        self.tfidf_model = joblib.load(self.tfidf_path)
-        self.nb_model = joblib.load(self.nb_path)
+        # 由以上两个模型导出的参数，推理时不需要 sklearn，见 intent_classifier.py
+        self.intent_model_path = os.path.join(cur_dir, 'model/intent_model.npz')
 
+        data_dir = os.path.join(cur_dir, 'data/')
+        self.cache_dir = os.path.join(cur_dir, 'cache')
         self.disease_path = data_dir + 'disease_vocab.txt'
         self.symptom_path = data_dir + 'symptom_vocab.txt'
         self.alias_path = data_dir + 'alias_vocab.txt'
         self.complication_path = data_dir + 'complications_vocab.txt'
-
-        self.disease_entities = [w.strip() for w in open(self.disease_path, encoding='utf8') if w.strip()]
-        self.symptom_entities = [w.strip() for w in open(self.symptom_path, encoding='utf8') if w.strip()]
-        self.alias_entities = [w.strip() for w in open(self.alias_path, encoding='utf8') if w.strip()]
-        self.complication_entities = [w.strip() for w in open(self.complication_path, encoding='utf8') if w.strip()]
-
-        self.region_words = list(set(self.disease_entities+self.alias_entities+self.symptom_entities))
-
-        # 构造领域actree
-        self.disease_tree = self.build_actree(list(set(self.disease_entities)))
-        self.alias_tree = self.build_actree(list(set(self.alias_entities)))
-        self.symptom_tree = self.build_actree(list(set(self.symptom_entities)))
-        self.complication_tree = self.build_actree(list(set(self.complication_entities)))
+        self.csv_path = data_dir + 'disease.csv'
 
         self.symptom_qwds = ['什么症状', '哪些症状', '症状有哪些', '症状是什么', '什么表征', '哪些表征', '表征是什么',
                              '什么现象', '哪些现象', '现象有哪些', '症候', '什么表现', '哪些表现', '表现有哪些',
@@ -60,156 +67,313 @@ class EntityExtractor:
         self.disase_qwds = ['什么病', '啥病', '得了什么', '得了哪种', '怎么回事', '咋回事', '回事',
                             '什么情况', '什么问题', '什么毛病', '啥毛病', '哪种病']  # 询问疾病
 
-    def build_actree(self, wordlist):
+        # 特征词分组，顺序即关键词特征向量的维度顺序
+        self.keyword_groups = [("disease", self.disase_qwds), ("symptom", self.symptom_qwds),
+                               ("cureway", self.cureway_qwds), ("check", self.check_qwds),
+                               ("lasttime", self.lasttime_qwds), ("cureprob", self.cureprob_qwds),
+                               ("belong", self.belong_qwds)]
+
+        # 实体actree、别名映射和模糊匹配索引在第一次使用时才加载
+        self._components = {}
+        self._components_lock = threading.RLock()
+        self.bundle_path = bundle_path or os.path.join(self.cache_dir, 'extractor.bundle')
+        self.bundle = self.open_bundle() if use_bundle else None
+        if self.bundle is not None:
+            self.stopwords = self.bundle.get('stopwords')
+            self.entity_table = EntityTable(self.bundle.raw('entities/pool'), self.bundle.get('entities/offsets'),
+                                            self.bundle.get('entities/string_ids'), self.bundle.get('entities/kinds'),
+                                            self.bundle.get('entities/ranges'))
+            config = self.bundle.get('intent/config')
+            self.intent_classifier = IntentClassifier(
+                self.bundle.get('intent/vocabulary'), self.bundle.get('intent/idf'),
+                self.bundle.get('intent/feature_log_prob'), self.bundle.get('intent/class_log_prior'),
+                self.bundle.get('intent/classes'), config['token_pattern'], config['lowercase'])
+            # 前缀词典直接映射 bundle 文件，不需要反序列化
+            freq = FreqTable(self.bundle.raw('jieba/keys'), self.bundle.get('jieba/starts'),
+                             self.bundle.get('jieba/freqs'), self.bundle.get('jieba/slots'))
+            tokenizer = frozen_tokenizer(freq, self.bundle.get('jieba/total'))
+            self.segmenter = Segmenter(self.vocab_path, self.cache_dir, segment_cache_size, tokenizer)
+            self.keyword_tree = self.bundle.get('keyword_tree')
+        else:
+            self.stopwords = self.load_stopwords()
+            self.entity_table = EntityTable.from_files(self.entity_paths())
+            self.intent_classifier = IntentClassifier.load(self.intent_model_path)
+            # 加载用户词典的分词器，每个进程只初始化一次
+            self.segmenter = Segmenter(self.vocab_path, self.cache_dir, segment_cache_size)
+            self.keyword_tree = self.build_keyword_tree()
+
+        # 各类实体词表，元素在访问时才从实体表解码
+        self.disease_entities = self.entity_table.entities("Disease")
+        self.symptom_entities = self.entity_table.entities("Symptom")
+        self.alias_entities = self.entity_table.entities("Alias")
+        self.complication_entities = self.entity_table.entities("Complication")
+
+    def entity_paths(self):
+        """
+        各类实体的词表文件，顺序与 entity_types 一致
+        :return: [(type, path)]
+        """
+        return [("Disease", self.disease_path), ("Alias", self.alias_path), ("Symptom", self.symptom_path),
+                ("Complication", self.complication_path)]
+
+    def load_stopwords(self):
+        return [w.strip() for w in open(self.stopwords_path, 'r', encoding='utf8') if w.strip()]
+
+    def bundle_sources(self):
+        """
+        bundle 依赖的源文件和版本，任一变化后 bundle 过期
+        :return: ({源文件名: 路径}, {名称: 版本号})
+        """
+        paths = {"vocab": self.vocab_path, "stopwords": self.stopwords_path, "disease_vocab": self.disease_path,
+                 "symptom_vocab": self.symptom_path, "alias_vocab": self.alias_path,
+                 "complication_vocab": self.complication_path, "disease_csv": self.csv_path,
+                 "intent_model": self.intent_model_path}
+        keywords = json.dumps(self.keyword_groups, ensure_ascii=False).encode('utf8')
+        versions = {"jieba": jieba.__version__, "keywords": hashlib.md5(keywords).hexdigest()}
+        return paths, versions
+
+    def open_bundle(self):
+        """
+        打开启动 bundle，不存在或已过期时返回 None
+        :return: Bundle
+        """
+        if not os.path.exists(self.bundle_path):
+            return None
+        bundle = Bundle(self.bundle_path)
+        if bundle.is_stale(*self.bundle_sources()):
+            print("{0} 已过期，从源文件加载；请运行 python bundle.py build 重新生成".format(self.bundle_path))
+            return None
+        return bundle
+
+    def build_bundle(self):
+        """
+        将启动所需的数据从源文件打包为一个 bundle 文件
+        :return: 文件大小
+        """
+        tokenizer = get_tokenizer(self.vocab_path, self.cache_dir)
+        keys, starts, freqs, slots = FreqTable.build(tokenizer.FREQ)
+        classifier = IntentClassifier.load(self.intent_model_path)
+        table = EntityTable.from_files(self.entity_paths())
+        sections = {
+            "stopwords": ("lines", self.load_stopwords()),
+            "entities/pool": ("bytes", table.pool),
+            "entities/offsets": ("array", table.offsets),
+            "entities/string_ids": ("array", table.string_ids),
+            "entities/kinds": ("array", table.kinds),
+            "entities/ranges": ("json", table.ranges),
+            "entity_tree": ("pickle", self.load_entity_tree(table)),
+            "alias_map": ("pickle", self.load_alias_map()),
+            "keyword_tree": ("pickle", self.build_keyword_tree()),
+            "intent/vocabulary": ("lines", sorted(classifier.vocabulary, key=classifier.vocabulary.get)),
+            "intent/idf": ("array", classifier.idf),
+            "intent/feature_log_prob": ("array", classifier.feature_log_prob),
+            "intent/class_log_prior": ("array", classifier.class_log_prior),
+            "intent/classes": ("lines", classifier.classes.tolist()),
+            "intent/config": ("json", {"token_pattern": classifier.token_pattern,
+                                       "lowercase": classifier.lowercase}),
+            "jieba/keys": ("bytes", keys),
+            "jieba/starts": ("array", starts),
+            "jieba/freqs": ("array", freqs),
+            "jieba/slots": ("array", slots),
+            "jieba/total": ("json", tokenizer.total),
+        }
+        os.makedirs(os.path.dirname(self.bundle_path), exist_ok=True)
+        return write_bundle(self.bundle_path, sections, *self.bundle_sources())
+
+    def component(self, name, load):
+        """
+        按需加载的组件，多个线程同时首次使用时只加载一次
+        :param name: 组件名
+        :param load: 加载函数
+        :return:
+        """
+        value = self._components.get(name)
+        if value is None:
+            with self._components_lock:
+                value = self._components.get(name)
+                if value is None:
+                    value = load()
+                    self._components[name] = value
+        return value
+
+    @property
+    def entity_tree(self):
+        """
+        四类实体合并而成的actree
+        """
+        if self.bundle is not None:
+            return self.component('entity_tree', lambda: self.bundle.get('entity_tree'))
+        return self.component('entity_tree', self.load_entity_tree)
+
+    @property
+    def alias_diseases(self):
+        """
+        别名到疾病名的映射，查询前将别名改写为疾病，只需按疾病名查询
+        """
+        if self.bundle is not None:
+            return self.component('alias_diseases', lambda: self.bundle.get('alias_map'))
+        return self.component('alias_diseases', self.load_alias_map)
+
+    @property
+    def fuzzy_matcher(self):
         """
-        构造actree，加速过滤
-        :param wordlist:
+        全匹配失败时使用的模糊匹配索引
+        """
+        return self.component('fuzzy_matcher', lambda: FuzzyMatcher(self.entity_types(), self.word_vectors))
+
+    def entity_types(self):
+        """
+        实体类型及其词表，顺序即 entity_reg 返回结果中的类型顺序
+        :return: [(type, entities)]
+        """
+        return [("Disease", self.disease_entities), ("Alias", self.alias_entities),
+                ("Symptom", self.symptom_entities), ("Complication", self.complication_entities)]
+
+    def build_keyword_tree(self):
+        """
+        将各组特征词构造成一棵actree，payload 为该词在各组中出现的 (组下标, 次数)
         :return:
         """
+        word_groups = {}
+        for index, (_, words) in enumerate(self.keyword_groups):
+            for word in words:
+                groups = word_groups.setdefault(word, {})
+                groups[index] = groups.get(index, 0) + 1
+
         actree = ahocorasick.Automaton()
-        # 向树中添加单词
-        for index, word in enumerate(wordlist):
-            actree.add_word(word, (index, word))
+        for word, groups in word_groups.items():
+            actree.add_word(word, (word, tuple(groups.items())))
         actree.make_automaton()
         return actree
 
-    def entity_reg(self, question):
+    def vocab_hash(self):
+        """
+        计算实体词表文件的哈希值，作为actree缓存的键
+        :return: str
+        """
+        md5 = hashlib.md5()
+        for path in [self.disease_path, self.alias_path, self.symptom_path, self.complication_path]:
+            with open(path, 'rb') as f:
+                md5.update(f.read())
+        return md5.hexdigest()
+
+    def load_cached(self, name, key, build):
+        """
+        读取磁盘缓存，不存在时调用 build 构造并写入缓存
+        :param name: 缓存名
+        :param key: 源文件的哈希值
+        :param build: 构造函数
+        :return:
+        """
+        cache_path = os.path.join(self.cache_dir, '{0}_{1}.pkl'.format(name, key))
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+
+        obj = build()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        return obj
+
+    def load_entity_tree(self, table=None):
+        """
+        加载合并后的实体actree，payload 为实体表中的字符串 ID，词表未变化时直接读取磁盘缓存
+        :param table: 与词表文件一致的 EntityTable，默认为 self.entity_table
+        :return:
+        """
+        if table is None:
+            table = self.entity_table
+        return self.load_cached('entity_ids_actree', self.vocab_hash(), table.build_automaton)
+
+    def load_alias_map(self):
+        """
+        加载别名到疾病名的映射，disease.csv 未变化时直接读取磁盘缓存
+        :return: {别名: [疾病名]}
+        """
+        # 读取 disease.csv 需要 pandas，只在生成缓存时导入
+        from build_graph import alias_map
+
+        with open(self.csv_path, 'rb') as f:
+            key = hashlib.md5(f.read()).hexdigest()
+        return self.load_cached('alias_map', key, lambda: alias_map(self.csv_path))
+
+    def resolve_aliases(self, result, intentions):
+        """
+        没有识别出疾病时，将别名改写为对应的疾病，查询时只需按疾病名单跳查询。
+        有别名不在映射中时保持原样，仍按别名查询。查询疾病的问题也保持原样：
+        按疾病查询疾病只会原样返回该疾病，仍按别名查询与别名相连的疾病
+        :param result: entity_reg 的结果
+        :param intentions: rule_intentions 得到的意图
+        :return: 改写后的结果
+        """
+        aliases = result.get("Alias")
+        if not aliases or "query_disease" in intentions or result.get("Disease") or any(a not in self.alias_diseases for a in aliases):
+            return result
+        diseases = list(dict.fromkeys(d for alias in aliases for d in self.alias_diseases[alias]))
+        resolved = {"Disease": diseases}
+        resolved.update((flag, words) for flag, words in result.items() if flag != "Alias")
+        return resolved
+
+    def longest_matches(self, matches):
+        """
+        最左最长匹配，去掉与已选词重叠的匹配
+        :param matches: [(start, end, word, types)]
+        :return:
+        """
+        selected = []
+        last_end = -1
+        for start, end, word, types in sorted(matches, key=lambda k: (k[0], k[0] - k[1])):
+            if start > last_end:
+                selected.append((start, end, word, types))
+                last_end = end
+        return selected
+
+    def entity_reg(self, question, longest=False):
         """
         模式匹配, 得到匹配的词和类型。如疾病，疾病别名，并发症，症状
         :param question:str
+        :param longest: 是否只保留最左最长匹配
         :return:
         """
-        self.result = {}
-
-        for i in self.disease_tree.iter(question):
-            word = i[1][1]
-            if "Disease" not in self.result:
-                self.result["Disease"] = [word]
-            else:
-                self.result["Disease"].append(word)
-
-        for i in self.alias_tree.iter(question):
-            word = i[1][1]
-            if "Alias" not in self.result:
-                self.result["Alias"] = [word]
-            else:
-                self.result["Alias"].append(word)
-
-        for i in self.symptom_tree.iter(question):
-            wd = i[1][1]
-            if "Symptom" not in self.result:
-                self.result["Symptom"] = [wd]
-            else:
-                self.result["Symptom"].append(wd)
-
-        for i in self.complication_tree.iter(question):
-            wd = i[1][1]
-            if "Complication" not in self.result:
-                self.result["Complication"] = [wd]
-            else:
-                self.result["Complication"] .append(wd)
-
-        return self.result
+        matches = []
+        for end, string_id in self.entity_tree.iter(question):
+            word = self.entity_table.word(string_id)
+            matches.append((end - len(word) + 1, end, word, self.entity_table.types(string_id)))
+        if longest:
+            matches = self.longest_matches(matches)
+
+        result = {}
+        for _, _, word, types in matches:
+            for flag in types:
+                if flag not in result:
+                    result[flag] = [word]
+                else:
+                    result[flag].append(word)
+
+        return {flag: result[flag] for flag, _ in self.entity_types() if flag in result}
 
     def find_sim_words(self, question):
         """
         当全匹配失败时，就采用相似度计算来找相似的词
         :param question:
-        :return:
+        :return: {type: [entity]}，没有相似的词时为空
         """
         import re
         import string
-        from gensim.models import KeyedVectors
-
-        jieba.load_userdict(self.vocab_path)
-        self.model = KeyedVectors.load_word2vec_format(self.word2vec_path, binary=False)
 
         sentence = re.sub("[{}]", re.escape(string.punctuation), question)
         sentence = re.sub("[，。‘’；：？、！【】]", " ", sentence)
         sentence = sentence.strip()
 
-        words = [w.strip() for w in jieba.cut(sentence) if w.strip() not in self.stopwords and len(w.strip()) >= 2]
+        words = [w.strip() for w in self.segmenter.cut(sentence) if w.strip() not in self.stopwords and len(w.strip()) >= 2]
 
-        alist = []
-
-        for word in words:
-            temp = [self.disease_entities, self.alias_entities, self.symptom_entities, self.complication_entities]
-            for i in range(len(temp)):
-                flag = ''
-                if i == 0:
-                    flag = "Disease"
-                elif i == 1:
-                    flag = "Alias"
-                elif i == 2:
-                    flag = "Symptom"
-                else:
-                    flag = "Complication"
-                scores = self.simCal(word, temp[i], flag)
-                alist.extend(scores)
-        temp1 = sorted(alist, key=lambda k: k[1], reverse=True)
-        if temp1:
-            self.result[temp1[0][2]] = [temp1[0][0]]
-
-    def editDistanceDP(self, s1, s2):
-        """
-        采用DP方法计算编辑距离
-        :param s1:
-        :param s2:
-        :return:
-        """
-        m = len(s1)
-        n = len(s2)
-        solution = [[0 for j in range(n + 1)] for i in range(m + 1)]
-        for i in range(len(s2) + 1):
-            solution[0][i] = i
-        for i in range(len(s1) + 1):
-            solution[i][0] = i
-
-        for i in range(1, m + 1):
-            for j in range(1, n + 1):
-                if s1[i - 1] == s2[j - 1]:
-                    solution[i][j] = solution[i - 1][j - 1]
-                else:
-                    solution[i][j] = 1 + min(solution[i][j - 1], min(solution[i - 1][j],
-                                                                     solution[i - 1][j - 1]))
-        return solution[m][n]
-
-    def simCal(self, word, entities, flag):
-        """
-        计算词语和字典中的词的相似度
-        相同字符的个数/min(|A|,|B|)   +  余弦相似度
-        :param word: str
-        :param entities:List
-        :return:
-        """
-        a = len(word)
-        scores = []
-        for entity in entities:
-            sim_num = 0
-            b = len(entity)
-            c = len(set(entity+word))
-            temp = []
-            for w in word:
-                if w in entity:
-                    sim_num += 1
-            if sim_num != 0:
-                score1 = sim_num / c  # overlap score
-                temp.append(score1)
-            try:
-                score2 = self.model.similarity(word, entity)  # 余弦相似度分数
-                temp.append(score2)
-            except:
-                pass
-            score3 = 1 - self.editDistanceDP(word, entity) / (a + b)  # 编辑距离分数
-            if score3:
-                temp.append(score3)
-
-            score = sum(temp) / len(temp)
-            if score >= 0.7:
-                scores.append((entity, score, flag))
-
-        scores.sort(key=lambda k: k[1], reverse=True)
-        return scores
+        best = self.fuzzy_matcher.most_similar(words)
+        if best:
+            return {best[2]: [best[0]]}
+        return {}
 
     def check_words(self, wds, sent):
         """
@@ -223,53 +387,41 @@ class EntityExtractor:
                 return True
         return False
 
-    def tfidf_features(self, text, vectorizer):
+    def tfidf_text(self, text):
         """
-        提取问题的TF-IDF特征
+        分词并去停用词，得到 TF-IDF 模型的输入文本
         :param text:
-        :param vectorizer:
-        :return:
+        :return: str
         """
-        jieba.load_userdict(self.vocab_path)
-        words = [w.strip() for w in jieba.cut(text) if w.strip() and w.strip() not in self.stopwords]
-        sents = [' '.join(words)]
-
-        tfidf = vectorizer.transform(sents).toarray()
-        return tfidf
+        words = [w.strip() for w in self.segmenter.cut(text) if w.strip() and w.strip() not in self.stopwords]
+        return ' '.join(words)
 
-    def other_features(self, text):
+    def keyword_features(self, text):
+        """
+        一次扫描问题，统计每组特征词在问题中出现的词数，并给出每组是否命中
+        :param text:
+        :return: (counts, hits)
+        """
+        found = {}
+        for _, (word, groups) in self.keyword_tree.iter(text):
+            found[word] = groups
+        counts = [0] * len(self.keyword_groups)
+        for groups in found.values():
+            for index, num in groups:
+                counts[index] += num
+        hits = {name: counts[index] > 0 for index, (name, _) in enumerate(self.keyword_groups)}
+        return counts, hits
+
+    def other_features(self, text, counts=None):
         """
         提取问题的关键词特征
         :param text:
+        :param counts: keyword_features 得到的特征词计数，为空时重新统计
         :return:
         """
-        features = [0] * 7
-        for d in self.disase_qwds:
-            if d in text:
-                features[0] += 1
-
-        for s in self.symptom_qwds:
-            if s in text:
-                features[1] += 1
-
-        for c in self.cureway_qwds:
-            if c in text:
-                features[2] += 1
-
-        for c in self.check_qwds:
-            if c in text:
-                features[3] += 1
-        for p in self.lasttime_qwds:
-            if p in text:
-                features[4] += 1
-
-        for r in self.cureprob_qwds:
-            if r in text:
-                features[5] += 1
-
-        for d in self.belong_qwds:
-            if d in text:
-                features[6] += 1
+        if counts is None:
+            counts, _ = self.keyword_features(text)
+        features = list(counts)
 
         m = max(features)
         n = min(features)
@@ -283,74 +435,50 @@ class EntityExtractor:
 
         return np.array(normed_features)
 
-    def model_predict(self, x, model):
+    def rule_intentions(self, types, predicted, hits):
         """
-        预测意图
-        :param x:
-        :param model:
-        :return:
+        在模型预测的意图基础上，根据实体类型和特征词规则补充查询意图
+        :param types: 实体类型
+        :param predicted: 模型预测的意图
+        :param hits: keyword_features 得到的各组特征词命中情况
+        :return: 意图列表
         """
-        pred = model.predict(x)
-        return pred
-
-    # 实体抽取主函数
-    def extractor(self, question):
-        self.entity_reg(question)
-        if not self.result:
-            self.find_sim_words(question)
-
-        types = []  # 实体类型
-        for v in self.result.keys():
-            types.append(v)
-
-        intentions = []  # 查询意图
-
-        # 意图预测
-        tfidf_feature = self.tfidf_features(question, self.tfidf_model)
-
-        other_feature = self.other_features(question)
-        m = other_feature.shape
-        other_feature = np.reshape(other_feature, (1, m[0]))
-
-        feature = np.concatenate((tfidf_feature, other_feature), axis=1)
-
-        predicted = self.model_predict(feature, self.nb_model)
-        intentions.append(predicted[0])
+        intentions = [predicted]  # 查询意图
 
         # 已知疾病，查询症状
-        if self.check_words(self.symptom_qwds, question) and ('Disease' in types or 'Alia' in types):
+        if hits['symptom'] and ('Disease' in types or 'Alia' in types):
             intention = "query_symptom"
             if intention not in intentions:
                 intentions.append(intention)
         # 已知疾病或症状，查询治疗方法
-        if self.check_words(self.cureway_qwds, question) and \
+        if hits['cureway'] and \
                 ('Disease' in types or 'Symptom' in types or 'Alias' in types or 'Complication' in types):
             intention = "query_cureway"
             if intention not in intentions:
                 intentions.append(intention)
         # 已知疾病或症状，查询治疗周期
-        if self.check_words(self.lasttime_qwds, question) and ('Disease' in types or 'Alia' in types):
+        if hits['lasttime'] and ('Disease' in types or 'Alia' in types):
             intention = "query_period"
             if intention not in intentions:
                 intentions.append(intention)
         # 已知疾病，查询治愈率
-        if self.check_words(self.cureprob_qwds, question) and ('Disease' in types or 'Alias' in types):
+        if hits['cureprob'] and ('Disease' in types or 'Alias' in types):
             intention = "query_rate"
             if intention not in intentions:
                 intentions.append(intention)
         # 已知疾病，查询检查项目
-        if self.check_words(self.check_qwds, question) and ('Disease' in types or 'Alias' in types):
+        if hits['check'] and ('Disease' in types or 'Alias' in types):
             intention = "query_checklist"
             if intention not in intentions:
                 intentions.append(intention)
         # 查询科室
-        if self.check_words(self.belong_qwds, question) and \
+        if hits['belong'] and \
                 ('Disease' in types or 'Symptom' in types or 'Alias' in types or 'Complication' in types):
             intention = "query_department"
             if intention not in intentions:
                 intentions.append(intention)
         # 已知症状，查询疾病
-        if self.check_words(self.disase_qwds, question) and ("Symptom" in types or "Complication" in types):
+        if hits['disease'] and ("Symptom" in types or "Complication" in types):
             intention = "query_disease"
             if intention not in intentions:
                 intentions.append(intention)
@@ -361,7 +489,7 @@ class EntityExtractor:
             if intention not in intentions:
                 intentions.append(intention)
         # 若是疾病和症状同时出现，且出现了查询疾病的特征词，则意图为查询疾病
-        if self.check_words(self.disase_qwds, question) and ('Disease' in types or 'Alias' in types) \
+        if hits['disease'] and ('Disease' in types or 'Alias' in types) \
                 and ("Symptom" in types or "Complication" in types):
             intention = "query_disease"
             if intention not in intentions:
@@ -372,6 +500,57 @@ class EntityExtractor:
             if intention not in intentions:
                 intentions.append(intention)
 
-        self.result["intentions"] = intentions
+        return intentions
 
-        return self.result
+    # 实体抽取主函数
+    def extractor(self, question):
+        result = self.entity_reg(question)
+        if not result:
+            result = self.find_sim_words(question)
+
+        types = []  # 实体类型
+        for v in result.keys():
+            types.append(v)
+
+        # 意图预测
+        counts, hits = self.keyword_features(question)
+        other_feature = self.other_features(question, counts)
+
+        predicted = self.intent_classifier.predict([self.tfidf_text(question)], [other_feature])
+        intentions = self.rule_intentions(types, predicted[0], hits)
+        result = self.resolve_aliases(result, intentions)
+        result["intentions"] = intentions
+
+        return result
+
+    def extract_batch(self, questions):
+        """
+        批量抽取实体和意图：一次模型预测，结果与逐条调用 extractor 相同
+        :param questions: [str]
+        :return: [dict]
+        """
+        if not questions:
+            return []
+        results = []
+        sents = []
+        other_features = []
+        hits_list = []
+        for question in questions:
+            result = self.entity_reg(question)
+            if not result:
+                result = self.find_sim_words(question)
+            results.append(result)
+            sents.append(self.tfidf_text(question))
+            counts, hits = self.keyword_features(question)
+            other_features.append(self.other_features(question, counts))
+            hits_list.append(hits)
+
+        predicted = self.intent_classifier.predict(sents, np.vstack(other_features))
+        resolved = []
+        for result, intent, hits in zip(results, predicted, hits_list):
+            types = list(result.keys())
+            intentions = self.rule_intentions(types, intent, hits)
+            result = self.resolve_aliases(result, intentions)
+            result["intentions"] = intentions
+            resolved.append(result)
+        return resolved
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import argparse
+import tracemalloc
+from array import array
+from collections import defaultdict
+import ahocorasick
+
+# 实体类型，顺序即 entity_reg 返回结果中的类型顺序
+ENTITY_KINDS = ["Disease", "Alias", "Symptom", "Complication"]
+
+
+class EntityColumn:
+    __slots__ = ('table', 'start', 'stop')
+
+    def __init__(self, table, start, stop):
+        """
+        某一类实体的只读序列，元素在访问时才从字符串池解码，可以代替词表列表使用
+        :param table: EntityTable
+        :param start: 起始实体 ID
+        :param stop: 结束实体 ID（不含）
+        """
+        self.table = table
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.table.entity(self.start + i)
+
+    def __iter__(self):
+        for entity_id in range(self.start, self.stop):
+            yield self.table.entity(entity_id)
+
+
+class EntityTable:
+    def __init__(self, pool, offsets, string_ids, kinds, ranges):
+        """
+        实体表：每个字符串只在字符串池中保存一份，实体以整数 ID 引用，各列为定长数组。
+        实体 ID 按类型连续分配，同一个词属于多个类型时占多个实体 ID，但只有一个字符串 ID
+        :param pool: 所有不同字符串 utf8 编码后依次拼接
+        :param offsets: int64，第 i 个字符串在 pool 中的起止位置为 offsets[i], offsets[i + 1]
+        :param string_ids: int32，实体 ID -> 字符串 ID
+        :param kinds: uint8，字符串 ID -> 所属类型的位掩码，第 k 位对应 ranges 中的第 k 个类型
+        :param ranges: {类型: (起始实体 ID, 结束实体 ID)}，区间内的顺序与词表文件一致
+        """
+        self.pool = memoryview(pool).cast('B')
+        self.offsets = memoryview(offsets).cast('B').cast('q')
+        self.string_ids = memoryview(string_ids).cast('B').cast('i')
+        self.kinds = memoryview(kinds).cast('B')
+        self.ranges = {flag: tuple(bounds) for flag, bounds in ranges.items()}
+        # 位掩码 -> 类型元组，按类型顺序排列
+        flags = list(self.ranges)
+        self._types = [tuple(flag for k, flag in enumerate(flags) if mask >> k & 1) for mask in range(1 << len(flags))]
+
+    @classmethod
+    def from_words(cls, entity_types):
+        """
+        :param entity_types: [(类型, 词表)]
+        :return: EntityTable
+        """
+        strings = {}
+        encoded = []
+        offsets = array('q', [0])
+        string_ids = array('i')
+        kinds = array('B')
+        ranges = {}
+        for k, (flag, words) in enumerate(entity_types):
+            start = len(string_ids)
+            for word in words:
+                string_id = strings.get(word)
+                if string_id is None:
+                    string_id = strings[word] = len(encoded)
+                    encoded.append(word.encode('utf8'))
+                    offsets.append(offsets[-1] + len(encoded[-1]))
+                    kinds.append(0)
+                kinds[string_id] |= 1 << k
+                string_ids.append(string_id)
+            ranges[flag] = (start, len(string_ids))
+        return cls(b''.join(encoded), offsets, string_ids, kinds, ranges)
+
+    @classmethod
+    def from_files(cls, paths):
+        """
+        :param paths: [(类型, 词表文件)]，每行一个词
+        :return: EntityTable
+        """
+        entity_types = []
+        for flag, path in paths:
+            with open(path, encoding='utf8') as f:
+                entity_types.append((flag, [w.strip() for w in f if w.strip()]))
+        return cls.from_words(entity_types)
+
+    def __len__(self):
+        return len(self.string_ids)
+
+    @property
+    def string_count(self):
+        return len(self.kinds)
+
+    def word(self, string_id):
+        return str(self.pool[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf8')
+
+    def types(self, string_id):
+        """
+        :param string_id: 字符串 ID
+        :return: 该词所属的类型，按类型顺序排列
+        """
+        return self._types[self.kinds[string_id]]
+
+    def entity(self, entity_id):
+        return self.word(self.string_ids[entity_id])
+
+    def id_range(self, flag):
+        """
+        :param flag: 实体类型
+        :return: 该类实体的 ID 区间
+        """
+        return range(*self.ranges[flag])
+
+    def entities(self, flag):
+        """
+        :param flag: 实体类型
+        :return: EntityColumn
+        """
+        return EntityColumn(self, *self.ranges[flag])
+
+    def build_automaton(self):
+        """
+        构造所有实体词的actree，payload 为字符串 ID，以整数形式存储在自动机内部
+        :return: ahocorasick.Automaton
+        """
+        actree = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+        for string_id in range(self.string_count):
+            actree.add_word(self.word(string_id), string_id)
+        actree.make_automaton()
+        return actree
+
+
+def char_postings(entities):
+    """
+    单字倒排索引，倒排表为 int32 数组
+    :param entities: 词表
+    :return: {字: array('i')}
+    """
+    postings = defaultdict(list)
+    for i, entity in enumerate(entities):
+        for ch in set(entity):
+            postings[ch].append(i)
+    return {ch: array('i', ids) for ch, ids in postings.items()}
+
+
+def legacy_layout(paths):
+    """
+    改为实体表之前 EntityExtractor 保存实体的方式：每类一个词表列表、未使用的 region_words、
+    payload 为 (单词, 类型元组) 的actree，以及列表形式的单字倒排索引
+    :param paths: [(类型, 词表文件)]
+    :return:
+    """
+    entity_types = []
+    for flag, path in paths:
+        with open(path, encoding='utf8') as f:
+            entity_types.append((flag, [w.strip() for w in f if w.strip()]))
+    words = dict(entity_types)
+    region_words = list(set(words["Disease"] + words["Alias"] + words["Symptom"]))
+
+    word_types = {}
+    for flag, entities in entity_types:
+        for word in entities:
+            types = word_types.setdefault(word, ())
+            if flag not in types:
+                word_types[word] = types + (flag,)
+    actree = ahocorasick.Automaton()
+    for word, types in word_types.items():
+        actree.add_word(word, (word, types))
+    actree.make_automaton()
+
+    char_index = {}
+    for flag, entities in entity_types:
+        postings = defaultdict(list)
+        for i, entity in enumerate(entities):
+            for ch in set(entity):
+                postings[ch].append(i)
+        char_index[flag] = dict(postings)
+    return entity_types, region_words, actree, char_index
+
+
+def table_layout(paths):
+    """
+    实体表方式：EntityTable、payload 为整数的actree，以及数组形式的单字倒排索引
+    :param paths: [(类型, 词表文件)]
+    :return:
+    """
+    table = EntityTable.from_files(paths)
+    actree = table.build_automaton()
+    char_index = {flag: char_postings(table.entities(flag)) for flag, _ in paths}
+    return table, actree, char_index
+
+
+def measure_memory(build, paths):
+    """
+    :param build: 构造函数
+    :param paths: [(类型, 词表文件)]
+    :return: 构造结果占用的内存（字节）
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        layout = build(paths)
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del layout
+    return size
+
+
+def vocab_paths():
+    cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+    files = {"Disease": 'disease_vocab.txt', "Alias": 'alias_vocab.txt', "Symptom": 'symptom_vocab.txt',
+             "Complication": 'complications_vocab.txt'}
+    return [(flag, os.path.join(cur_dir, 'data', files[flag])) for flag in ENTITY_KINDS]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比较两种实体存储方式每个进程占用的内存")
+    parser.add_argument("--workers", type=int, default=4, help="工作进程数")
+    args = parser.parse_args()
+
+    paths = vocab_paths()
+    legacy = measure_memory(legacy_layout, paths)
+    compact = measure_memory(table_layout, paths)
+    print("词表+actree+倒排索引：原方式 {0:.1f} MB，实体表 {1:.1f} MB，每个进程节省 {2:.1f} MB，"
+          "{3} 个进程共节省 {4:.1f} MB".format(legacy / 1024 / 1024, compact / 1024 / 1024,
+                                          (legacy - compact) / 1024 / 1024, args.workers,
+                                          (legacy - compact) * args.workers / 1024 / 1024))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import time
+import argparse
+import threading
+from memory_graph import MemoryGraph
+from search_answer import AnswerSearching, Neo4jBackend
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return [dict(row) for row in self.rows]
+
+
+class FakeGraph:
+    def __init__(self, answers, latency=0.1, delays=None):
+        """
+        模拟 py2neo.Graph 的本地图谱：按 cypher 语句返回预先给定的结果，每次查询注入延迟，
+        并记录同时进行的查询数
+        :param answers: {cypher 语句: 结果行}
+        :param latency: 每次查询的默认延迟（秒）
+        :param delays: {cypher 语句: 延迟}，覆盖默认延迟
+        """
+        self.answers = answers
+        self.latency = latency
+        self.delays = delays or {}
+        self.calls = 0
+        self.config = {}
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def run(self, statement, parameters=None):
+        if statement.startswith("CALL dbms.setConfigValue"):
+            self.config['dbms.transaction.timeout'] = parameters['value']
+            return FakeCursor([])
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delays.get(statement, self.latency))
+        finally:
+            with self._lock:
+                self.running -= 1
+        return FakeCursor(self.answers.get(statement, []))
+
+
+def timed_search(searcher, sqls):
+    start = time.monotonic()
+    answers, degraded = searcher.search_answers(sqls)
+    return answers, degraded, time.monotonic() - start
+
+
+def check_fanout(graph, latency=0.2):
+    """
+    用注入延迟的 FakeGraph 检查并发查询：答案及顺序与顺序执行一致，
+    总耗时接近最慢的一条查询，超时的意图不返回答案且不拖慢其它意图
+    :param graph: MemoryGraph，用于生成参考答案和 FakeGraph 的结果
+    :param latency: 每条查询的延迟（秒）
+    :return: 失败的检查项
+    """
+    # 取各意图都有答案的疾病
+    diseases = sorted(name for name in graph.diseases
+                      if all(graph.neighbors(name, rel) for rel in ["HAS_SYMPTOM", "HAS_DRUG", "DEPARTMENT_IS"]))[:2]
+    data = {"Disease": diseases,
+            "intentions": ["query_symptom", "query_cureway", "query_period", "query_checklist", "query_department"]}
+    reference = AnswerSearching(graph, workers=1, cache_size=0)
+    sqls = reference.question_parser(data)
+    expected = reference.searching(sqls)
+    answers = {sql_['sql']: graph.search(sql_) for sql_ in sqls}
+    failures = []
+
+    # 顺序执行：耗时为各查询延迟之和
+    fake = FakeGraph(answers, latency)
+    serial = AnswerSearching(Neo4jBackend(pool_size=1, factory=lambda: fake), workers=1, cache_size=0)
+    result, degraded, serial_time = timed_search(serial, sqls)
+    if result != expected or degraded:
+        failures.append("顺序执行的答案与 MemoryGraph 不一致")
+
+    # 并发执行：答案和顺序不变，耗时接近一条查询
+    fake = FakeGraph(answers, latency)
+    searcher = AnswerSearching(Neo4jBackend(pool_size=len(sqls), factory=lambda: fake), workers=len(sqls),
+                               cache_size=0)
+    result, degraded, parallel_time = timed_search(searcher, sqls)
+    if result != expected or degraded:
+        failures.append("并发执行的答案或顺序与顺序执行不一致")
+    if fake.max_running != len(sqls):
+        failures.append("同时进行的查询数为 {0}，应为 {1}".format(fake.max_running, len(sqls)))
+    if parallel_time > 2 * latency:
+        failures.append("并发执行耗时 {0:.2f}s，超过两倍单条延迟".format(parallel_time))
+
+    # 超时：第二个意图的查询很慢，只有它不返回答案，整体答案标记为不完整
+    slow = sqls[1]['sql']
+    fake = FakeGraph(answers, latency, {slow: 5 * latency})
+    searcher = AnswerSearching(Neo4jBackend(pool_size=len(sqls), factory=lambda: fake), workers=len(sqls),
+                               timeout=2 * latency, cache_size=0)
+    result, degraded, timeout_time = timed_search(searcher, sqls)
+    want = AnswerSearching(graph, workers=1, cache_size=0).searching(sqls[:1] + sqls[2:])
+    if result != want:
+        failures.append("超时后其余意图的答案或顺序不正确")
+    if not degraded:
+        failures.append("有查询超时，但答案没有标记为不完整")
+    if timeout_time > 4 * latency:
+        failures.append("超时的查询拖慢了整体：{0:.2f}s".format(timeout_time))
+
+    # 线程不足时，超时后仍在排队的查询被取消，不再占用线程和连接；服务端事务超时在创建连接时设置
+    fake = FakeGraph(answers, 5 * latency)
+    searcher = AnswerSearching(Neo4jBackend(pool_size=2, factory=lambda: fake, transaction_timeout=2 * latency),
+                               workers=2, timeout=2 * latency, cache_size=0)
+    timed_search(searcher, sqls)
+    searcher.executor.shutdown(wait=True)
+    if fake.calls != 2:
+        failures.append("超时后仍执行了 {0} 条排队的查询".format(fake.calls - 2))
+    if fake.config.get('dbms.transaction.timeout') != "%dms" % round(2 * latency * 1000):
+        failures.append("没有设置服务端事务超时")
+
+    print("{0} 个意图，单条延迟 {1}s：顺序 {2:.2f}s，并发 {3:.2f}s，含超时查询 {4:.2f}s".format(
+        len(sqls), latency, serial_time, parallel_time, timeout_time))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用注入延迟的假图谱检查并发查询的顺序、并发度和超时")
+    parser.add_argument("--latency", type=float, default=0.2, help="每条查询的延迟（秒）")
+    args = parser.parse_args()
+
+    failures = check_fanout(MemoryGraph.from_file(), args.latency)
+    for failure in failures:
+        print(failure)
+    if failures:
+        raise SystemExit(1)
+    print("检查通过")
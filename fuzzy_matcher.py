@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import math
+import numpy as np
+from edit_distance import batch_distance
+from entity_table import char_postings
+
+
+class FuzzyMatcher:
+    def __init__(self, entity_types, word_vectors, threshold=0.7, top_k=100):
+        """
+        模糊实体匹配：先用单字倒排索引和余弦相似度缩小候选集合，再对候选实体计算与 fuzzy_reference.sim_cal 相同的分数
+        :param entity_types: [(type, entities)]
+        :param word_vectors: WordVectors
+        :param threshold: 分数阈值
+        :param top_k: 每个词按余弦分数召回的无公共字实体数上限
+        """
+        self.entity_types = entity_types
+        self.word_vectors = word_vectors
+        self.threshold = threshold
+        self.top_k = top_k
+        # 没有公共字的实体只能依靠余弦分数达到阈值：此时 temp=[余弦, 编辑距离分数]，
+        # 编辑距离分数不超过 0.5，因此余弦分数至少为 2 * threshold - 0.5
+        self.cosine_floor = 2 * threshold - 0.5
+
+        self.char_index = {flag: char_postings(entities) for flag, entities in entity_types}
+        # 每类实体的归一化向量矩阵，未登录实体对应全零行并在 mask 中标记为 False
+        self.entity_matrices = self.build_entity_matrices()
+
+    def build_entity_matrices(self):
+        """
+        预先构造每类实体的向量矩阵
+        :return: {type: (matrix, mask)}
+        """
+        index = self.word_vectors.index
+        vectors = self.word_vectors.vectors
+        matrices = {}
+        for flag, entities in self.entity_types:
+            mask = np.array([entity in index for entity in entities], dtype=bool)
+            matrix = np.zeros((len(entities), vectors.shape[1]), dtype=np.float32)
+            if mask.any():
+                matrix[mask] = vectors[[index[entity] for entity in entities if entity in index]]
+            matrices[flag] = (matrix, mask)
+        return matrices
+
+    def cosine_scores(self, words):
+        """
+        一次矩阵乘法计算所有查询词与每类实体的余弦分数，未登录的词或实体为 nan
+        :param words: [str]
+        :return: {type: np.ndarray(len(words), len(entities))}
+        """
+        rows = [self.word_vectors.index.get(word) for word in words]
+        known = np.array([row is not None for row in rows], dtype=bool)
+        queries = np.zeros((len(words), self.word_vectors.vectors.shape[1]), dtype=np.float32)
+        if known.any():
+            queries[known] = self.word_vectors.vectors[[row for row in rows if row is not None]]
+
+        scores = {}
+        for flag, (matrix, mask) in self.entity_matrices.items():
+            sims = queries.dot(matrix.T)
+            sims[~known, :] = np.nan
+            sims[:, ~mask] = np.nan
+            scores[flag] = sims
+        return scores
+
+    def candidates(self, word, flag, sims):
+        """
+        召回候选实体，并记录每个候选的公共字数和余弦分数
+        :param word: str
+        :param flag: 实体类型
+        :param sims: 该词与此类实体的余弦分数向量
+        :return: {实体下标: [公共字数, 余弦分数或None]}
+        """
+        postings = self.char_index[flag]
+        found = {}
+        # 与 sim_cal 一致，按查询词逐字（含重复字）统计公共字数
+        for w in word:
+            for i in postings.get(w, ()):
+                if i in found:
+                    found[i][0] += 1
+                else:
+                    found[i] = [1, None]
+        if not len(sims):
+            return found
+
+        valid = ~np.isnan(sims)
+        for i in found:
+            if valid[i]:
+                found[i][1] = float(sims[i])
+
+        # 无公共字的实体按余弦分数取 top_k
+        k = min(self.top_k, int(valid.sum()))
+        if k:
+            filled = np.where(valid, sims, -np.inf)
+            top = np.argpartition(-filled, k - 1)[:k]
+            for i in top[filled[top] >= self.cosine_floor - 1e-6].tolist():
+                if i not in found:
+                    found[i] = [0, float(sims[i])]
+        return found
+
+    def match(self, word, flag, sims=None):
+        """
+        与 fuzzy_reference.sim_cal 结果相同：返回分数不低于阈值的实体，按分数降序
+        :param word: str
+        :param flag: 实体类型
+        :param sims: 该词与此类实体的余弦分数向量，为空时单独计算
+        :return: [(entity, score, flag)]
+        """
+        if sims is None:
+            sims = self.cosine_scores([word])[flag][0]
+        entities = dict(self.entity_types)[flag]
+        a = len(word)
+        pending = []
+        for i, (sim_num, sim) in sorted(self.candidates(word, flag, sims).items()):
+            entity = entities[i]
+            b = len(entity)
+            temp = []
+            if sim_num != 0:
+                temp.append(sim_num / len(set(entity + word)))  # overlap score
+            if sim is not None:
+                temp.append(sim)  # 余弦相似度分数
+            # 达到阈值所需的最低编辑距离分数，换算成编辑距离上限；超过上限的候选直接剪枝
+            need = self.threshold * (len(temp) + 1) - sum(temp)
+            max_dist = math.floor((1 - need) * (a + b) + 1e-9)
+            if max_dist < abs(a - b):
+                continue
+            pending.append((entity, temp, max_dist))
+
+        scores = []
+        if not pending:
+            return scores
+        distances = batch_distance(word, [p[0] for p in pending], [p[2] for p in pending])
+        for (entity, temp, max_dist), dist in zip(pending, distances.tolist()):
+            if dist > max_dist:
+                continue
+            score3 = 1 - dist / (a + len(entity))  # 编辑距离分数
+            if score3:
+                temp.append(score3)
+
+            score = sum(temp) / len(temp)
+            if score >= self.threshold:
+                scores.append((entity, score, flag))
+
+        scores.sort(key=lambda k: k[1], reverse=True)
+        return scores
+
+    def most_similar(self, words):
+        """
+        在所有词和所有实体类型中找分数最高的实体
+        :param words: [str]
+        :return: (entity, score, flag) 或 None
+        """
+        alist = []
+        cosine = self.cosine_scores(words)
+        for n, word in enumerate(words):
+            for flag, _ in self.entity_types:
+                alist.extend(self.match(word, flag, cosine[flag][n]))
+        alist.sort(key=lambda k: k[1], reverse=True)
+        return alist[0] if alist else None
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import random
+import argparse
+from edit_distance import edit_distance
+from entity_extractor import EntityExtractor
+
+
+def sim_cal(word, entities, flag, word_vectors, threshold=0.7):
+    """
+    原先 EntityExtractor.simCal 的逐个实体计算，只用于检查 FuzzyMatcher 的结果。
+    分数为 公共字数/并集字数、余弦相似度、编辑距离分数 三者中存在的项的平均值
+    :param word: str
+    :param entities: 词表
+    :param flag: 实体类型
+    :param word_vectors: WordVectors
+    :param threshold: 分数阈值
+    :return: [(entity, score, flag)]，按分数降序
+    """
+    a = len(word)
+    index = word_vectors.index
+    scores = []
+    for entity in entities:
+        sim_num = 0
+        b = len(entity)
+        c = len(set(entity + word))
+        temp = []
+        for w in word:
+            if w in entity:
+                sim_num += 1
+        if sim_num != 0:
+            temp.append(sim_num / c)  # overlap score
+        if word in index and entity in index:
+            temp.append(word_vectors.similarity(word, entity))  # 余弦相似度分数
+        score3 = 1 - edit_distance(word, entity) / (a + b)  # 编辑距离分数
+        if score3:
+            temp.append(score3)
+
+        score = sum(temp) / len(temp)
+        if score >= threshold:
+            scores.append((entity, score, flag))
+
+    scores.sort(key=lambda k: k[1], reverse=True)
+    return scores
+
+
+def same_scores(got, want):
+    return len(got) == len(want) and all(e1 == e2 and abs(s1 - s2) < 1e-9 and f1 == f2
+                                         for (e1, s1, f1), (e2, s2, f2) in zip(got, want))
+
+
+def check_fuzzy_matcher(extractor, words):
+    """
+    比较 FuzzyMatcher.match 与逐个实体计算的结果
+    :param extractor: EntityExtractor
+    :param words: 查询词
+    :return: 不一致的 (词, 实体类型)
+    """
+    mismatched = []
+    for word in words:
+        for flag, entities in extractor.entity_types():
+            want = sim_cal(word, entities, flag, extractor.word_vectors, extractor.fuzzy_matcher.threshold)
+            if not same_scores(extractor.fuzzy_matcher.match(word, flag), want):
+                mismatched.append((word, flag))
+    return mismatched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用逐个实体计算的原实现检查 FuzzyMatcher 的模糊匹配结果")
+    parser.add_argument("--words", type=int, default=50, help="随机生成的查询词数")
+    args = parser.parse_args()
+
+    extractor = EntityExtractor()
+    rng = random.Random(0)
+    entities = [entity for _, words in extractor.entity_types() for entity in words]
+    words = []
+    while len(words) < args.words:
+        # 打乱字序或截去一部分字，得到与实体相近但不相同的词
+        entity = rng.choice(entities)
+        words.append(''.join(rng.sample(entity, len(entity))) if rng.random() < 0.5 else entity[:max(2, len(entity) - 1)])
+    mismatched = check_fuzzy_matcher(extractor, words)
+    for word, flag in mismatched:
+        print("结果不一致：", word, flag)
+    print("{0} 个词：{1}".format(len(words), "结果一致" if not mismatched else "{0} 处不一致".format(len(mismatched))))
+    if mismatched:
+        raise SystemExit(1)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import re
+import math
+import numpy as np
+
+
+class IntentClassifier:
+    def __init__(self, vocabulary, idf, feature_log_prob, class_log_prior, classes, token_pattern=r"(?u)\b\w\w+\b",
+                 lowercase=True):
+        """
+        意图分类的 numpy 推理实现，与 TfidfVectorizer + OneVsRestClassifier(MultinomialNB) 的预测结果一致，
+        推理时不需要 sklearn。模型参数由 export_intent_model 从训练好的 sklearn 模型导出
+        :param vocabulary: TF-IDF 词表，按特征下标排列
+        :param idf: 各词的 idf
+        :param feature_log_prob: (意图数, 2, 特征数)，每个二分类器的 feature_log_prob_，
+                                 特征为 TF-IDF 特征后接关键词特征
+        :param class_log_prior: (意图数, 2)，每个二分类器的 class_log_prior_
+        :param classes: 意图名
+        :param token_pattern: 与 TfidfVectorizer 相同的分词正则
+        :param lowercase: 是否转小写
+        """
+        self.vocabulary = {word: i for i, word in enumerate(vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.feature_log_prob = np.asarray(feature_log_prob, dtype=np.float64)
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self._token_re = re.compile(token_pattern)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: export_intent_model 导出的 npz 文件
+        :return: IntentClassifier
+        """
+        with np.load(path) as data:
+            return cls(data['vocabulary'].tolist(), data['idf'], data['feature_log_prob'], data['class_log_prior'],
+                       data['classes'], str(data['token_pattern']), bool(data['lowercase']))
+
+    def save(self, path):
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(path, vocabulary=np.array(vocabulary), idf=self.idf, feature_log_prob=self.feature_log_prob,
+                 class_log_prior=self.class_log_prior, classes=self.classes,
+                 token_pattern=np.array(self.token_pattern), lowercase=np.array(self.lowercase))
+
+    def tfidf(self, text):
+        """
+        与 TfidfVectorizer.transform 相同：正则分词、计数、乘以 idf 后按 l2 归一化
+        :param text: 分词后以空格连接的文本
+        :return: (特征下标, 特征值)，下标升序
+        """
+        if self.lowercase:
+            text = text.lower()
+        counts = {}
+        for token in self._token_re.findall(text):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        ids = np.array(sorted(counts), dtype=np.int64)
+        values = np.array([counts[i] for i in ids.tolist()], dtype=np.float64) * self.idf[ids]
+        # 与 sklearn 一样按下标顺序累加平方和
+        total = 0.0
+        for value in values.tolist():
+            total += value * value
+        if total:
+            values /= math.sqrt(total)
+        return ids, values
+
+    def predict_proba(self, texts, features):
+        """
+        每个意图的二分类器判为正类的概率，即 OneVsRestClassifier 比较的分数
+        :param texts: [str]
+        :param features: (len(texts), 关键词特征数)
+        :return: np.ndarray(len(texts), 意图数)
+        """
+        features = np.asarray(features, dtype=np.float64).reshape(len(texts), -1)
+        n_vocab = len(self.idf)
+        other_log_prob = self.feature_log_prob[:, :, n_vocab:]
+        jll = np.empty((len(texts),) + self.class_log_prior.shape)
+        for i, text in enumerate(texts):
+            ids, values = self.tfidf(text)
+            jll[i] = self.feature_log_prob[:, :, ids].dot(values) + other_log_prob.dot(features[i]) + \
+                self.class_log_prior
+        # 与 MultinomialNB.predict_proba 相同，对每个二分类器的两类做 log-sum-exp 归一化
+        a_max = jll.max(axis=2, keepdims=True)
+        log_prob_x = np.log(np.exp(jll - a_max).sum(axis=2, keepdims=True)) + a_max
+        return np.exp(jll[:, :, 1] - log_prob_x[:, :, 0])
+
+    def predict(self, texts, features):
+        """
+        预测意图。与 OneVsRestClassifier.predict 一样取分数最高的意图，同分时取靠后的意图
+        :param texts: [str]
+        :param features: (len(texts), 关键词特征数)
+        :return: np.ndarray(str)
+        """
+        scores = self.predict_proba(texts, features)
+        last = scores.shape[1] - 1 - np.argmax(scores[:, ::-1], axis=1)
+        return self.classes[last]
+
+
+def export_intent_model(vectorizer, model, out_path):
+    """
+    导出训练好的 sklearn 模型参数
+    :param vectorizer: TfidfVectorizer
+    :param model: OneVsRestClassifier(MultinomialNB)，特征为 TF-IDF 特征后接关键词特征
+    :param out_path: 输出的 npz 文件
+    :return: IntentClassifier
+    """
+    params = vectorizer.get_params()
+    if params['analyzer'] != 'word' or tuple(params['ngram_range']) != (1, 1) or params['binary'] or \
+            params['norm'] != 'l2' or not params['use_idf'] or params['sublinear_tf'] or \
+            params['stop_words'] is not None or params['tokenizer'] is not None or \
+            params['preprocessor'] is not None or params['strip_accents'] is not None:
+        raise ValueError("不支持的 TfidfVectorizer 参数：{0}".format(params))
+    if model.label_binarizer_.y_type_ != 'multiclass':
+        raise ValueError("只支持多分类的 OneVsRestClassifier")
+
+    vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    classifier = IntentClassifier(vocabulary, vectorizer.idf_,
+                                  [estimator.feature_log_prob_ for estimator in model.estimators_],
+                                  [estimator.class_log_prior_ for estimator in model.estimators_],
+                                  model.classes_, params['token_pattern'], params['lowercase'])
+    classifier.save(out_path)
+    return classifier
+
+
+def verify_intent_model(vectorizer, model, classifier, texts, features):
+    """
+    比较 sklearn 模型与导出参数的预测结果，输入与原先 EntityExtractor 调用 sklearn 模型时相同：
+    TF-IDF 特征后接关键词特征的稠密矩阵
+    :param vectorizer: TfidfVectorizer
+    :param model: OneVsRestClassifier(MultinomialNB)
+    :param classifier: IntentClassifier
+    :param texts: [str]，tfidf_text 的结果
+    :param features: (len(texts), 关键词特征数)
+    :return: 预测结果不一致的下标
+    """
+    features = np.asarray(features, dtype=np.float64).reshape(len(texts), -1)
+    expected = model.predict(np.concatenate((vectorizer.transform(texts).toarray(), features), axis=1))
+    return np.flatnonzero(np.asarray(expected) != classifier.predict(texts, features))
+
+
+if __name__ == "__main__":
+    import argparse
+    from sklearn.externals import joblib
+
+    parser = argparse.ArgumentParser(description="从 sklearn 模型导出意图分类参数，或检查导出结果")
+    parser.add_argument("--verify", action="store_true", help="不导出，比较 sklearn 模型与已导出参数的预测结果")
+    parser.add_argument("--questions", type=int, default=5000, help="--verify 时生成的问题数")
+    args = parser.parse_args()
+
+    cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+    vectorizer = joblib.load(os.path.join(cur_dir, 'model/tfidf_model.m'))
+    model = joblib.load(os.path.join(cur_dir, 'model/intent_reg_model.m'))
+    model_path = os.path.join(cur_dir, 'model/intent_model.npz')
+    if not args.verify:
+        export_intent_model(vectorizer, model, model_path)
+        raise SystemExit
+
+    from entity_extractor import EntityExtractor
+    from concurrency_check import make_questions
+
+    extractor = EntityExtractor(use_bundle=False)
+    questions = make_questions(extractor, args.questions)
+    texts = [extractor.tfidf_text(question) for question in questions]
+    features = np.vstack([extractor.other_features(question) for question in questions])
+    mismatched = verify_intent_model(vectorizer, model, IntentClassifier.load(model_path), texts, features)
+    for i in mismatched[:20]:
+        print("预测不一致：", questions[i])
+    print("{0} 个问题，{1} 个预测不一致".format(len(questions), len(mismatched)))
+    if len(mismatched):
+        raise SystemExit(1)
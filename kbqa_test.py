@@ -1,26 +1,105 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import re
+import time
+import atexit
+import threading
+import unicodedata
 from entity_extractor import EntityExtractor
 from search_answer import AnswerSearching
+from build_graph import read_graph_version
+from diagnosis import DiagnosisEngine
+from cache import LRUCache
+
+
+def normalize_question(question):
+    """
+    问题归一化：全角转半角，去掉标点和空白，作为答案缓存的键
+    :param question: str
+    :return: str
+    """
+    text = unicodedata.normalize('NFKC', question)
+    return ''.join(ch for ch in re.sub(r'\s+', '', text) if not unicodedata.category(ch).startswith('P'))
 
 
 class KBQA:
-    def __init__(self):
+    def __init__(self, backend=None, cache_size=10000, cache_ttl=24 * 3600, negative_ttl=600, cache_path=None,
+                 cards=None, diagnosis=None, workers=4, timeout=10):
+        """
+        :param backend: 知识图谱查询后端，默认使用 neo4j，见 AnswerSearching
+        :param cache_size: 问题答案缓存条数，0 表示不缓存
+        :param cache_ttl: 答案缓存的过期时间（秒）
+        :param negative_ttl: 无法回答的问题的缓存过期时间（秒）
+        :param cache_path: 答案缓存的持久化文件，进程退出时写入，启动时恢复
+        :param cards: answer_cards.AnswerCards，疾病和别名的问题直接读取预先生成的答案
+        :param diagnosis: 由症状推断疾病的 DiagnosisEngine，默认由 disease.csv 构造
+        :param workers: 并发查询的线程数
+        :param timeout: 每条图谱查询的超时时间（秒），None 表示不限制
+        """
+        self.default_answer = "对不起，您的问题我不知道，我今后会努力改进的。"
         self.extractor = EntityExtractor()
-        self.searcher = AnswerSearching()
+        diagnosis = diagnosis if diagnosis is not None else DiagnosisEngine.from_file()
+        self.searcher = AnswerSearching(backend, workers=workers, timeout=timeout, cards=cards, diagnosis=diagnosis)
+
+        self.negative_ttl = negative_ttl
+        self.cache_path = cache_path
+        self.cache = LRUCache(cache_size, cache_ttl) if cache_size else None
+        # 图谱重建后答案缓存整体失效；版本号也写入缓存键，从文件恢复的旧版本答案不会命中
+        self._version = read_graph_version(self.searcher.version_path)
+        self._version_checked = time.monotonic()
+        self._version_lock = threading.Lock()
+        if self.cache is not None and cache_path:
+            self.cache.load(cache_path)
+            atexit.register(self.save_cache)
+
+    def save_cache(self):
+        if self.cache is not None and self.cache_path:
+            self.cache.save(self.cache_path)
+
+    def graph_version(self):
+        """
+        定期检查图谱版本号，图谱重建后清空答案缓存
+        :return: 当前版本号
+        """
+        with self._version_lock:
+            now = time.monotonic()
+            if now - self._version_checked >= self.searcher.version_check_interval:
+                self._version_checked = now
+                version = read_graph_version(self.searcher.version_path)
+                if version != self._version:
+                    self._version = version
+                    self.cache.clear()
+            return self._version
 
     def qa_main(self, input_str):
-        answer = "对不起，您的问题我不知道，我今后会努力改进的。"
+        if self.cache is None:
+            return self.answer(input_str)[0]
+        key = self.graph_version() + '|' + normalize_question(input_str)
+        answer = self.cache.get(key)
+        if answer is None:
+            answer, degraded = self.answer(input_str)
+            # 有意图的查询超时或出错时答案不完整，不缓存
+            if not degraded:
+                ttl = self.negative_ttl if answer == self.default_answer else None
+                self.cache.set(key, answer, ttl)
+        return answer
+
+    def answer(self, input_str):
+        """
+        :param input_str: 问题
+        :return: (答案, degraded)，degraded 为 True 时有意图的查询超时或出错
+        """
+        answer = self.default_answer
         entities = self.extractor.extractor(input_str)
         if not entities:
-            return answer
+            return answer, False
         sqls = self.searcher.question_parser(entities)
-        final_answer = self.searcher.searching(sqls)
+        final_answer, degraded = self.searcher.search_answers(sqls)
         if not final_answer:
-            return answer
+            return answer, degraded
         else:
-            return '\n'.join(final_answer)
+            return '\n'.join(final_answer), degraded
 
 
 if __name__ == "__main__":
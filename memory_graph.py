@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import sys
+from build_graph import DISEASE_PROPERTIES, read_disease_file
+
+# 疾病指向各类实体的关系
+RELATIONS = {"Alias": "ALIAS_IS", "Symptom": "HAS_SYMPTOM", "Part": "PART_IS", "Department": "DEPARTMENT_IS",
+             "Complication": "HAS_COMPLICATION", "Drug": "HAS_DRUG"}
+DESCRIBE_KEYS = ['d.name', 'd.age', 'd.insurance', 'd.infection', 'd.checklist', 'd.period', 'd.rate', 'd.money']
+
+
+class DiseaseRecord:
+    __slots__ = DISEASE_PROPERTIES
+
+    def __init__(self, info):
+        """
+        疾病节点的属性，比 dict 占用的内存少
+        :param info: parse_disease 得到的疾病属性
+        """
+        for key in DISEASE_PROPERTIES:
+            setattr(self, key, info[key])
+        self.name = sys.intern(self.name)
+
+
+class MemoryGraph:
+    def __init__(self, disease_infos, relations):
+        """
+        进程内的知识图谱，与 MedicalGraph 导入 neo4j 的节点和关系一致，
+        可以代替 neo4j 作为 AnswerSearching 的查询后端
+        :param disease_infos: 疾病属性列表，每行一个疾病节点
+        :param relations: {rel_type: [[disease, entity]]}
+        """
+        # 疾病名 -> 疾病节点列表（数据中同名疾病会建成多个节点）
+        self.diseases = {}
+        for info in disease_infos:
+            record = DiseaseRecord(info)
+            self.diseases.setdefault(record.name, []).append(record)
+
+        # 关系邻接表：rel_type -> {疾病名: [实体名]}，以及反向 rel_type -> {实体名: [疾病名]}
+        self.out_edges = {}
+        self.in_edges = {}
+        for rel_type, edges in relations.items():
+            out_edges = {}
+            in_edges = {}
+            seen = set()
+            for p, q in edges:
+                if (p, q) in seen or p not in self.diseases:
+                    continue
+                # 同一实体在各行中解析出的字符串只保留一份
+                p = sys.intern(p)
+                q = sys.intern(q)
+                seen.add((p, q))
+                out_edges.setdefault(p, []).append(q)
+                in_edges.setdefault(q, []).append(p)
+            self.out_edges[rel_type] = out_edges
+            self.in_edges[rel_type] = in_edges
+
+    @classmethod
+    def from_file(cls, data_path=None):
+        """
+        使用与 MedicalGraph.read_file 相同的解析逻辑从 disease.csv 构造图谱
+        :param data_path: disease.csv 路径
+        :return: MemoryGraph
+        """
+        if data_path is None:
+            cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+            data_path = os.path.join(cur_dir, 'data/disease.csv')
+        _, _, _, _, _, _, _, rel_alias, rel_symptom, rel_part, rel_department, rel_complication, rel_drug, \
+            rel_infos = read_disease_file(data_path)
+        relations = {"ALIAS_IS": rel_alias, "HAS_SYMPTOM": rel_symptom, "PART_IS": rel_part,
+                     "DEPARTMENT_IS": rel_department, "HAS_COMPLICATION": rel_complication,
+                     "HAS_DRUG": rel_drug}
+        return cls(rel_infos, relations)
+
+    def disease_nodes(self, label, name):
+        """
+        label 为 Disease 时返回同名疾病节点，否则返回与该实体相连的疾病节点
+        :param label: 实体标签
+        :param name: 实体名
+        :return: [DiseaseRecord]
+        """
+        if label == "Disease":
+            return self.diseases.get(name, [])
+        nodes = []
+        for disease in self.in_edges[RELATIONS[label]].get(name, []):
+            nodes.extend(self.diseases[disease])
+        return nodes
+
+    def neighbors(self, disease, rel_type):
+        return self.out_edges[rel_type].get(disease, [])
+
+    def search(self, sql_):
+        """
+        按 question_parser 给出的意图、标签和实体查询，返回与对应 cypher 语句相同的结果行：
+        每个实体每个疾病一行，每个实体最多 limit 个疾病；query_disease 对所有实体汇总计数
+        :param sql_: {"intention", "label", "entities", "limit", ...}
+        :return: [dict]
+        """
+        intent = sql_['intention']
+        label = sql_['label']
+        limit = sql_.get('limit')
+        if intent == "query_disease":
+            freq = {}
+            for entity in sql_['entities']:
+                for d in self.disease_nodes(label, entity):
+                    freq[d.name] = freq.get(d.name, 0) + 1
+            ranked = sorted(freq.items(), key=lambda k: (-k[1], k[0]))[:limit]
+            return [{'d.name': name, 'freq': n} for name, n in ranked]
+
+        rows = []
+        for entity in sql_['entities']:
+            groups = {}
+            for d in self.disease_nodes(label, entity):
+                groups.setdefault(d.name, []).append(d)
+            entity_rows = []
+            for name in sorted(groups):
+                row = self.row(intent, groups[name])
+                if row is not None:
+                    row['entity'] = entity
+                    entity_rows.append(row)
+            rows.extend(entity_rows[:limit])
+        return rows
+
+    def row(self, intent, nodes):
+        """
+        将同名疾病节点聚合为某一意图的一行结果，列表形式的列去重
+        :param intent: 查询意图
+        :param nodes: 同名疾病节点列表
+        :return: dict，没有结果时为 None
+        """
+        name = nodes[0].name
+        if intent == "query_symptom":
+            symptoms = self.neighbors(name, "HAS_SYMPTOM")
+            return {'d.name': name, 's.name': list(symptoms)} if symptoms else None
+        if intent == "query_cureway":
+            drugs = self.neighbors(name, "HAS_DRUG")
+            return {'d.name': name, 'd.treatment': nodes[0].treatment, 'n.name': list(drugs)} if drugs else None
+        if intent in ["query_period", "query_rate", "query_checklist"]:
+            key = intent.split('_')[1]
+            return {'d.name': name, 'd.' + key: list(dict.fromkeys(getattr(d, key) for d in nodes))}
+        if intent == "query_department":
+            departments = self.neighbors(name, "DEPARTMENT_IS")
+            return {'d.name': name, 'n.name': list(departments)} if departments else None
+        if intent == "disease_describe":
+            return {key: getattr(nodes[0], key[2:]) for key in DESCRIBE_KEYS}
+        return None
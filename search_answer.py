@@ -1,12 +1,193 @@
 #!/usr/bin/env python3
 # coding: utf-8
-from py2neo import Graph
+import os
+import math
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from contextlib import contextmanager
+from build_graph import read_graph_version
+from cache import LRUCache
+
+
+def per_disease(columns, values):
+    """
+    构造按 (实体, 疾病) 聚合的返回子句，每个实体按疾病名排序后最多保留 $limit 个疾病
+    :param columns: 结果列名
+    :param values: 聚合表达式，与 columns 一一对应
+    :return: str
+    """
+    aggregates = ", ".join("{0} AS v{1}".format(value, i) for i, value in enumerate(values))
+    items = ", ".join("v{0}".format(i) for i in range(len(values)))
+    returns = ", ".join("row[{0}] AS `{1}`".format(i + 1, column) for i, column in enumerate(columns))
+    return "WITH name, d.name AS dname, {0} ORDER BY dname " \
+           "WITH name, collect([dname, {1}])[..$limit] AS rows UNWIND rows AS row " \
+           "RETURN name AS entity, row[0] AS `d.name`, {2}".format(aggregates, items, returns)
+
+
+# 各意图的聚合和返回子句，列表形式的列已在服务端去重
+AGGREGATIONS = {
+    "query_symptom": per_disease(["s.name"], ["collect(DISTINCT s.name)"]),
+    "query_cureway": per_disease(["d.treatment", "n.name"], ["head(collect(d.treatment))", "collect(DISTINCT n.name)"]),
+    "query_period": per_disease(["d.period"], ["collect(DISTINCT d.period)"]),
+    "query_rate": per_disease(["d.rate"], ["collect(DISTINCT d.rate)"]),
+    "query_checklist": per_disease(["d.checklist"], ["collect(DISTINCT d.checklist)"]),
+    "query_department": per_disease(["n.name"], ["collect(DISTINCT n.name)"]),
+    # 同名疾病取第一个节点的属性
+    "disease_describe": "WITH name, d.name AS dname, collect(d)[0] AS d ORDER BY dname "
+                        "WITH name, collect(d)[..$limit] AS nodes UNWIND nodes AS d "
+                        "RETURN name AS entity, d.name, d.age, d.insurance, d.infection, d.checklist, d.period, "
+                        "d.rate, d.money",
+    # 对所有实体汇总，按匹配的次数排序
+    "query_disease": "WITH d.name AS dname, count(*) AS freq ORDER BY freq DESC, dname LIMIT $limit "
+                     "RETURN dname AS `d.name`, freq",
+}
+# 跨实体汇总的意图，结果行没有 entity 列
+AGGREGATE_INTENTS = ["query_disease"]
+
+
+def as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def connect_neo4j():
+    """
+    创建 Neo4j 连接，py2neo 在第一次连接时才导入
+    :return: py2neo.Graph
+    """
+    from py2neo import Graph
+
+    return Graph("http://localhost:7474", username="neo4j", password="123456789")
+
+
+class GraphPool:
+    def __init__(self, size=4, factory=None, timeout=30):
+        """
+        py2neo.Graph 连接池，连接在第一次被用到时创建，最多 size 个
+        :param size: 连接数
+        :param factory: 创建连接的函数
+        :param timeout: 连接全部借出时等待归还的最长时间（秒），None 表示一直等待
+        """
+        self.size = size
+        self.factory = factory or connect_neo4j
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        借出一个连接，用完后归还
+        :return: py2neo.Graph
+        """
+        graph = None
+        try:
+            graph = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    graph = self.factory()
+                except Exception:
+                    # 连接失败时归还名额，否则失败几次后连接池就再也借不出连接
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    graph = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError("等待 neo4j 连接超时")
+        try:
+            yield graph
+        finally:
+            self._idle.put(graph)
+
+
+def limit_transaction_time(graph, seconds):
+    """
+    设置 neo4j 服务端的事务超时 dbms.transaction.timeout（neo4j 3.4 起可以动态修改），
+    客户端放弃等待后，服务端也会终止仍在执行的查询并释放连接。该设置对整个数据库生效，需要管理员权限；
+    设置失败时需要在 neo4j.conf 中配置
+    :param graph: py2neo.Graph
+    :param seconds: 超时时间（秒）
+    :return:
+    """
+    value = "%dms" % math.ceil(seconds * 1000)
+    try:
+        graph.run("CALL dbms.setConfigValue('dbms.transaction.timeout', $value)", parameters={'value': value})
+    except Exception as e:
+        print("无法设置服务端事务超时，请在 neo4j.conf 中设置 dbms.transaction.timeout={0}：{1}".format(value, e))
+
+
+class Neo4jBackend:
+    def __init__(self, graph=None, pool_size=4, factory=None, transaction_timeout=None):
+        """
+        通过 neo4j 执行 cypher 查询的后端
+        :param graph: py2neo.Graph，指定时所有查询共用该连接
+        :param pool_size: 未指定 graph 时连接池的大小
+        :param factory: 未指定 graph 时创建连接的函数，默认连接本机 neo4j
+        :param transaction_timeout: 服务端事务超时（秒），创建连接时设置，见 limit_transaction_time
+        """
+        if graph is not None:
+            factory = lambda: graph
+            pool_size = 1
+        factory = factory or connect_neo4j
+        self.transaction_timeout = transaction_timeout
+        if transaction_timeout is not None:
+            connect = factory
+
+            def factory():
+                graph = connect()
+                limit_transaction_time(graph, transaction_timeout)
+                return graph
+        self.pool = GraphPool(pool_size, factory)
+
+    def search(self, sql_):
+        """
+        执行 question_parser 构造的 cypher 查询语句，所有实体通过参数 names 一次发送
+        :param sql_: {"intention", "label", "entities", "limit", "sql"}
+        :return: [dict]
+        """
+        with self.pool.connection() as graph:
+            return graph.run(sql_['sql'], parameters={'names': sql_['entities'], 'limit': sql_['limit']}).data()
 
 
 class AnswerSearching:
-    def __init__(self):
-        self.graph = Graph("http://localhost:7474", username="neo4j", password="123456789")
+    def __init__(self, backend=None, workers=4, timeout=None, cache_size=10000, cache_ttl=None, cards=None,
+                 diagnosis=None):
+        """
+        :param backend: 查询后端，需实现 search(sql_)，默认为 Neo4jBackend；
+                        也可使用 memory_graph.MemoryGraph 在进程内查询
+        :param workers: 并发执行各意图查询的线程数，1 表示顺序执行
+        :param timeout: 每条查询的超时时间（秒），超时的意图不返回答案；
+                        默认的 Neo4jBackend 同时以此作为服务端事务超时
+        :param cache_size: 按 (意图, 标签, 实体) 缓存查询结果的条数，0 表示不缓存
+        :param cache_ttl: 缓存过期时间（秒），None 表示只在图谱重建时失效
+        :param cards: answer_cards.AnswerCards，指定时疾病和别名的问题直接读取预先生成的答案，
+                      只有由症状推断疾病等问题才查询图谱
+        :param diagnosis: diagnosis.DiagnosisEngine，指定时由症状或并发症推断疾病的问题在进程内计算
+        """
+        self.backend = backend if backend is not None else Neo4jBackend(pool_size=workers, transaction_timeout=timeout)
         self.top_num = 10
+        self.timeout = timeout
+        self.cards = cards
+        self.diagnosis = diagnosis
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        # 查询结果缓存，MedicalGraph 重建图谱时写入新的版本号，版本号变化后整体失效
+        cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+        self.version_path = os.path.join(cur_dir, 'data/graph_version')
+        self.version_check_interval = 5
+        self.cache = LRUCache(cache_size, cache_ttl) if cache_size else None
+        self._version = read_graph_version(self.version_path)
+        self._version_checked = time.monotonic()
+        self._version_lock = threading.Lock()
 
     def question_parser(self, data):
         """
@@ -20,130 +201,83 @@ class AnswerSearching:
                 sql_ = {}
                 sql_["intention"] = intent
                 sql = []
-                if data.get("Disease"):
-                   sql = self.transfor_to_sql("Disease", data["Disease"], intent)
-                elif data.get("Alias"):
-                    sql = self.transfor_to_sql("Alias", data["Alias"], intent)
-                elif data.get("Symptom"):
-                    sql = self.transfor_to_sql("Symptom", data["Symptom"], intent)
-                elif data.get("Complication"):
-                    sql = self.transfor_to_sql("Complication", data["Complication"], intent)
+                for label in ["Disease", "Alias", "Symptom", "Complication"]:
+                    if data.get(label):
+                        sql = self.transfor_to_sql(label, data[label], intent)
+                        sql_["label"] = label
+                        sql_["entities"] = data[label]
+                        break
 
                 if sql:
+                    sql_['limit'] = self.top_num
                     sql_['sql'] = sql
                     sqls.append(sql_)
         return sqls
 
     def transfor_to_sql(self, label, entities, intent):
         """
-        将问题转变为cypher查询语句
+        将问题转变为cypher查询语句。每个意图和标签对应一条参数化语句，
+        通过 UNWIND 参数 $names 一次查询所有实体。结果在服务端按疾病聚合：
+        每个实体每个疾病一行，取值去重后以列表返回，每个实体最多返回 $limit 个疾病；
+        query_disease 对所有实体汇总计数，只返回频次最高的 $limit 个疾病
         :param label:实体标签
         :param entities:实体列表
         :param intent:查询意图
-        :return:cypher查询语句
+        :return:cypher查询语句，不支持时为空字符串
         """
         if not entities:
-            return []
-        sql = []
+            return ""
+        match = ""
 
         # 查询症状
         if intent == "query_symptom" and label == "Disease":
-            sql = ["MATCH (d:Disease)-[:HAS_SYMPTOM]->(s) WHERE d.name='{0}' RETURN d.name,s.name".format(e)
-                   for e in entities]
+            match = "MATCH (d:Disease)-[:HAS_SYMPTOM]->(s) WHERE d.name=name "
         if intent == "query_symptom" and label == "Alias":
-            sql = ["MATCH (a:Alias)<-[:ALIAS_IS]-(d:Disease)-[:HAS_SYMPTOM]->(s) WHERE a.name='{0}' return " \
-                   "d.name,s.name".format(e) for e in entities]
+            match = "MATCH (a:Alias)<-[:ALIAS_IS]-(d:Disease)-[:HAS_SYMPTOM]->(s) WHERE a.name=name "
 
         # 查询治疗方法
         if intent == "query_cureway" and label == "Disease":
-            sql = ["MATCH (d:Disease)-[:HAS_DRUG]->(n) WHERE d.name='{0}' return d.name,d.treatment," \
-                   "n.name".format(e) for e in entities]
+            match = "MATCH (d:Disease)-[:HAS_DRUG]->(n) WHERE d.name=name "
         if intent == "query_cureway" and label == "Alias":
-            sql = ["MATCH (n)<-[:HAS_DRUG]-(d:Disease)-[]->(a:Alias) WHERE a.name='{0}' " \
-                   "return d.name, d.treatment, n.name".format(e) for e in entities]
+            match = "MATCH (n)<-[:HAS_DRUG]-(d:Disease)-[]->(a:Alias) WHERE a.name=name "
         if intent == "query_cureway" and label == "Symptom":
-            sql = ["MATCH (n)<-[:HAS_DRUG]-(d:Disease)-[]->(s:Symptom) WHERE s.name='{0}' " \
-                   "return d.name,d.treatment, n.name".format(e) for e in entities]
+            match = "MATCH (n)<-[:HAS_DRUG]-(d:Disease)-[]->(s:Symptom) WHERE s.name=name "
         if intent == "query_cureway" and label == "Complication":
-            sql = ["MATCH (n)<-[:HAS_DRUG]-(d:Disease)-[]->(c:Complication) WHERE c.name='{0}' " \
-                   "return d.name,d.treatment, n.name".format(e) for e in entities]
-
-        # 查询治疗周期
-        if intent == "query_period" and label == "Disease":
-            sql = ["MATCH (d:Disease) WHERE d.name='{0}' return d.name,d.period".format(e) for e in entities]
-        if intent == "query_period" and label == "Alias":
-            sql = ["MATCH (d:Disease)-[]->(a:Alias) WHERE a.name='{0}' return d.name,d.period".format(e)
-                   for e in entities]
-        if intent == "query_period" and label == "Symptom":
-            sql = ["MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name='{0}' return d.name,d.period".format(e)
-                   for e in entities]
-        if intent == "query_period" and label == "Complication":
-            sql = ["MATCH (d:Disease)-[]->(c:Complication) WHERE c.name='{0}' return d.name," \
-                   "d.period".format(e) for e in entities]
-
-        # 查询治愈率
-        if intent == "query_rate" and label == "Disease":
-            sql = ["MATCH (d:Disease) WHERE d.name='{0}' return d.name,d.rate".format(e) for e in entities]
-        if intent == "query_rate" and label == "Alias":
-            sql = ["MATCH (d:Disease)-[]->(a:Alias) WHERE a.name='{0}' return d.name,d.rate".format(e)
-                   for e in entities]
-        if intent == "query_rate" and label == "Symptom":
-            sql = ["MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name='{0}' return d.name,d.rate".format(e)
-                   for e in entities]
-        if intent == "query_rate" and label == "Complication":
-            sql = ["MATCH (d:Disease)-[]->(c:Complication) WHERE c.name='{0}' return d.name," \
-                   "d.rate".format(e) for e in entities]
+            match = "MATCH (n)<-[:HAS_DRUG]-(d:Disease)-[]->(c:Complication) WHERE c.name=name "
 
-        # 查询检查项目
-        if intent == "query_checklist" and label == "Disease":
-            sql = ["MATCH (d:Disease) WHERE d.name='{0}' return d.name,d.checklist".format(e) for e in entities]
-        if intent == "query_checklist" and label == "Alias":
-            sql = ["MATCH (d:Disease)-[]->(a:Alias) WHERE a.name='{0}' return d.name,d.checklist".format(e)
-                   for e in entities]
-        if intent == "query_checklist" and label == "Symptom":
-            sql = ["MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name='{0}' return d.name," \
-                   "d.checklist".format(e) for e in entities]
-        if intent == "query_checklist" and label == "Complication":
-            sql = ["MATCH (d:Disease)-[]->(c:Complication) WHERE c.name='{0}' return d.name," \
-                   "d.checklist".format(e) for e in entities]
+        # 查询治疗周期、治愈率、检查项目和疾病描述
+        if intent in ["query_period", "query_rate", "query_checklist", "disease_describe"]:
+            if label == "Disease":
+                match = "MATCH (d:Disease) WHERE d.name=name "
+            if label == "Alias":
+                match = "MATCH (d:Disease)-[]->(a:Alias) WHERE a.name=name "
+            if label == "Symptom":
+                match = "MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name=name "
+            if label == "Complication":
+                match = "MATCH (d:Disease)-[]->(c:Complication) WHERE c.name=name "
 
         # 查询科室
         if intent == "query_department" and label == "Disease":
-            sql = ["MATCH (d:Disease)-[:DEPARTMENT_IS]->(n) WHERE d.name='{0}' return d.name," \
-                   "n.name".format(e) for e in entities]
+            match = "MATCH (d:Disease)-[:DEPARTMENT_IS]->(n) WHERE d.name=name "
         if intent == "query_department" and label == "Alias":
-            sql = ["MATCH (n)<-[:DEPARTMENT_IS]-(d:Disease)-[:ALIAS_IS]->(a:Alias) WHERE a.name='{0}' " \
-                   "return d.name,n.name".format(e) for e in entities]
+            match = "MATCH (n)<-[:DEPARTMENT_IS]-(d:Disease)-[:ALIAS_IS]->(a:Alias) WHERE a.name=name "
         if intent == "query_department" and label == "Symptom":
-            sql = ["MATCH (n)<-[:DEPARTMENT_IS]-(d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE s.name='{0}' " \
-                   "return d.name,n.name".format(e) for e in entities]
+            match = "MATCH (n)<-[:DEPARTMENT_IS]-(d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE s.name=name "
         if intent == "query_department" and label == "Complication":
-            sql = ["MATCH (n)<-[:DEPARTMENT_IS]-(d:Disease)-[:HAS_COMPLICATION]->(c:Complication) WHERE " \
-                   "c.name='{0}' return d.name,n.name".format(e) for e in entities]
+            match = "MATCH (n)<-[:DEPARTMENT_IS]-(d:Disease)-[:HAS_COMPLICATION]->(c:Complication) WHERE " \
+                    "c.name=name "
 
         # 查询疾病
         if intent == "query_disease" and label == "Alias":
-            sql = ["MATCH (d:Disease)-[]->(s:Alias) WHERE s.name='{0}' return " \
-                   "d.name".format(e) for e in entities]
+            match = "MATCH (d:Disease)-[]->(s:Alias) WHERE s.name=name "
         if intent == "query_disease" and label == "Symptom":
-            sql = ["MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name='{0}' return " \
-                   "d.name".format(e) for e in entities]
+            match = "MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name=name "
+        if intent == "query_disease" and label == "Complication":
+            match = "MATCH (d:Disease)-[]->(c:Complication) WHERE c.name=name "
 
-        # 查询疾病描述
-        if intent == "disease_describe" and label == "Alias":
-            sql = ["MATCH (d:Disease)-[]->(a:Alias) WHERE a.name='{0}' return d.name,d.age," \
-                   "d.insurance,d.infection,d.checklist,d.period,d.rate,d.money".format(e) for e in entities]
-        if intent == "disease_describe" and label == "Disease":
-            sql = ["MATCH (d:Disease) WHERE d.name='{0}' return d.name,d.age,d.insurance,d.infection," \
-                   "d.checklist,d.period,d.rate,d.money".format(e) for e in entities]
-        if intent == "disease_describe" and label == "Symptom":
-            sql = ["MATCH (d:Disease)-[]->(s:Symptom) WHERE s.name='{0}' return d.name,d.age," \
-                   "d.insurance,d.infection,d.checklist,d.period,d.rate,d.money".format(e) for e in entities]
-        if intent == "disease_describe" and label == "Complication":
-            sql = ["MATCH (d:Disease)-[]->(c:Complication) WHERE c.name='{0}' return d.name," \
-                   "d.age,d.insurance,d.infection,d.checklist,d.period,d.rate,d.money".format(e) for e in entities]
-
-        return sql
+        if not match:
+            return ""
+        return "UNWIND $names AS name " + match + AGGREGATIONS[intent]
 
     def searching(self, sqls):
         """
@@ -151,24 +285,172 @@ class AnswerSearching:
         :param sqls:
         :return:str
         """
+        return self.search_answers(sqls)[0]
+
+    def search_answers(self, sqls):
+        """
+        执行cypher查询，返回结果以及是否有意图的查询超时或出错
+        :param sqls:
+        :return: ([str], degraded)，degraded 为 True 时答案不完整，不应缓存
+        """
+        self.check_version()
+        answers = {}
+        queries = []
+        for i, sql_ in enumerate(sqls):
+            if self.cards is not None and self.cards.supports(sql_['intention'], sql_['label']):
+                answers[i] = self.cards.answer(sql_['intention'], sql_['label'], sql_['entities'])
+            elif self.diagnosis is not None and self.diagnosis.supports(sql_['intention'], sql_['label']):
+                answers[i] = self.answer_template(sql_['intention'], self.diagnosis.search(sql_))
+            else:
+                queries.append(i)
+        degraded = False
+        for i, rows in zip(queries, self.run_queries([sqls[i] for i in queries])):
+            if rows is None:
+                degraded = True
+                rows = []
+            answers[i] = self.answer_template(sqls[i]['intention'], rows)
+
         final_answers = []
-        for sql_ in sqls:
-            intent = sql_['intention']
-            queries = sql_['sql']
-            answers = []
-            for query in queries:
-                ress = self.graph.run(query).data()
-                answers += ress
-            final_answer = self.answer_template(intent, answers)
-            if final_answer:
-                final_answers.append(final_answer)
-        return final_answers
+        for i in range(len(sqls)):
+            if answers[i]:
+                final_answers.append(answers[i])
+        return final_answers, degraded
+
+    def run_queries(self, sqls):
+        """
+        并发执行各意图的查询，结果顺序与 sqls 一致
+        :param sqls:
+        :return: [[dict]]，超时或出错的查询为 None
+        """
+        if self.executor is None or len(sqls) < 2:
+            return [self.search_with_timeout(sql_) for sql_ in sqls]
+
+        start = time.monotonic()
+        futures = [self.executor.submit(self.cached_search, sql_) for sql_ in sqls]
+        results = []
+        for sql_, future in zip(sqls, futures):
+            timeout = None if self.timeout is None else max(0, start + self.timeout - time.monotonic())
+            try:
+                results.append(future.result(timeout=timeout))
+            except TimeoutError:
+                # 还在排队的查询不再执行，已在执行的查询由服务端事务超时终止
+                future.cancel()
+                print("查询超时：", sql_['intention'], sql_['entities'])
+                results.append(None)
+            except Exception as e:
+                print("查询出错：", sql_['intention'], sql_['entities'], e)
+                results.append(None)
+        return results
+
+    def check_version(self):
+        """
+        定期检查图谱版本号，图谱重建后清空缓存并重新读取诊断引擎
+        :return: 当前的图谱版本号
+        """
+        with self._version_lock:
+            now = time.monotonic()
+            if now - self._version_checked < self.version_check_interval:
+                return self._version
+            self._version_checked = now
+            version = read_graph_version(self.version_path)
+            if version != self._version:
+                self._version = version
+                if self.cache is not None:
+                    self.cache.clear()
+                if self.diagnosis is not None:
+                    self.diagnosis = self.diagnosis.reload()
+            return self._version
+
+    def cache_rows(self, version, key, rows):
+        """
+        写入查询结果；查询期间图谱版本变化时结果来自旧图谱，不写入缓存
+        :param version: 查询开始时的图谱版本号
+        :param key: 缓存键
+        :param rows: [dict]
+        :return:
+        """
+        with self._version_lock:
+            if self._version == version:
+                self.cache.set(key, rows)
+
+    def cached_search(self, sql_):
+        """
+        按实体查缓存，只把未命中的实体发送给查询后端；结果行按实体顺序拼接，与直接查询一致
+        :param sql_: {"intention", "label", "entities", "limit", "sql"}
+        :return: [dict]
+        """
+        if self.cache is None:
+            return self.backend.search(sql_)
+        version = self.check_version()
+
+        intent = sql_['intention']
+        label = sql_['label']
+        if intent in AGGREGATE_INTENTS:
+            # 跨实体汇总的结果不能按实体拆分，以全部实体作为缓存键
+            key = (intent, label, tuple(sql_['entities']))
+            answers = self.cache.get(key)
+            if answers is None:
+                answers = self.backend.search(sql_)
+                self.cache_rows(version, key, answers)
+            return answers
+        rows = {}
+        missing = []
+        for entity in sql_['entities']:
+            if entity in rows or entity in missing:
+                continue
+            cached = self.cache.get((intent, label, entity))
+            if cached is None:
+                missing.append(entity)
+            else:
+                rows[entity] = cached
+
+        if missing:
+            fetched = {entity: [] for entity in missing}
+            query = dict(sql_)
+            query['entities'] = missing
+            for row in self.backend.search(query):
+                fetched[row['entity']].append(row)
+            for entity, entity_rows in fetched.items():
+                self.cache_rows(version, (intent, label, entity), entity_rows)
+            rows.update(fetched)
+
+        answers = []
+        for entity in sql_['entities']:
+            answers.extend(rows[entity])
+        return answers
+
+    def cache_stats(self):
+        """
+        查询缓存的命中、未命中和淘汰次数
+        :return: dict
+        """
+        return self.cache.stats() if self.cache is not None else {}
+
+    def search_with_timeout(self, sql_):
+        """
+        执行单个意图的查询
+        :param sql_:
+        :return: [dict]，超时或出错时为 None
+        """
+        try:
+            if self.executor is None or self.timeout is None:
+                return self.cached_search(sql_)
+            future = self.executor.submit(self.cached_search, sql_)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                print("查询超时：", sql_['intention'], sql_['entities'])
+                return None
+        except Exception as e:
+            print("查询出错：", sql_['intention'], sql_['entities'], e)
+            return None
 
     def answer_template(self, intent, answers):
         """
         根据不同意图，返回不同模板的答案
         :param intent: 查询意图
-        :param answers: 知识图谱查询结果
+        :param answers: 知识图谱查询结果，按疾病聚合的列为列表
         :return: str
         """
         final_answer = ""
@@ -179,26 +461,29 @@ class AnswerSearching:
             disease_dic = {}
             for data in answers:
                 d = data['d.name']
-                s = data['s.name']
+                s = as_list(data['s.name'])
                 if d not in disease_dic:
-                    disease_dic[d] = [s]
+                    disease_dic[d] = list(s)
                 else:
-                    disease_dic[d].append(s)
+                    disease_dic[d].extend(s)
             i = 0
             for k, v in disease_dic.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 final_answer += "疾病 {0} 的症状有：{1}\n".format(k, ','.join(list(set(v))))
                 i += 1
-        # 查询疾病
-        if intent == "query_disease":
+        # 查询疾病，诊断引擎的结果已按匹配度（余弦相似度，不是概率）排序
+        if intent == "query_disease" and 'score' in answers[0]:
+            for data in answers[:self.top_num]:
+                final_answer += "疾病 {0} 的匹配度为：{1:.2f}\n".format(data['d.name'], data['score'])
+        elif intent == "query_disease":
             disease_freq = {}
             for data in answers:
                 d = data["d.name"]
-                disease_freq[d] = disease_freq.get(d, 0) + 1
+                disease_freq[d] = disease_freq.get(d, 0) + data.get('freq', 1)
             n = len(disease_freq.keys())
             freq = sorted(disease_freq.items(), key=lambda x: x[1], reverse=True)
-            for d, v in freq[:10]:
+            for d, v in freq[:self.top_num]:
                 final_answer += "疾病为 {0} 的概率为：{1}\n".format(d, v/10)
         # 查询治疗方法
         if intent == "query_cureway":
@@ -206,14 +491,14 @@ class AnswerSearching:
             for data in answers:
                 disease = data['d.name']
                 treat = data["d.treatment"]
-                drug = data["n.name"]
+                drug = as_list(data["n.name"])
                 if disease not in disease_dic:
-                    disease_dic[disease] = [treat, drug]
+                    disease_dic[disease] = [treat] + drug
                 else:
-                    disease_dic[disease].append(drug)
+                    disease_dic[disease].extend(drug)
             i = 0
             for d, v in disease_dic.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 final_answer += "疾病 {0} 的治疗方法有：{1}；可用药品包括：{2}\n".format(d, v[0], ','.join(v[1:]))
                 i += 1
@@ -222,14 +507,14 @@ class AnswerSearching:
             disease_dic = {}
             for data in answers:
                 d = data['d.name']
-                p = data['d.period']
+                p = as_list(data['d.period'])
                 if d not in disease_dic:
-                    disease_dic[d] = [p]
+                    disease_dic[d] = list(p)
                 else:
-                    disease_dic[d].append(p)
+                    disease_dic[d].extend(p)
             i = 0
             for k, v in disease_dic.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 final_answer += "疾病 {0} 的治愈周期为：{1}\n".format(k, ','.join(list(set(v))))
                 i += 1
@@ -238,14 +523,14 @@ class AnswerSearching:
             disease_dic = {}
             for data in answers:
                 d = data['d.name']
-                r = data['d.rate']
+                r = as_list(data['d.rate'])
                 if d not in disease_dic:
-                    disease_dic[d] = [r]
+                    disease_dic[d] = list(r)
                 else:
-                    disease_dic[d].append(r)
+                    disease_dic[d].extend(r)
             i = 0
             for k, v in disease_dic.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 final_answer += "疾病 {0} 的治愈率为：{1}\n".format(k, ','.join(list(set(v))))
                 i += 1
@@ -254,14 +539,14 @@ class AnswerSearching:
             disease_dic = {}
             for data in answers:
                 d = data['d.name']
-                r = data['d.checklist']
+                r = as_list(data['d.checklist'])
                 if d not in disease_dic:
-                    disease_dic[d] = [r]
+                    disease_dic[d] = list(r)
                 else:
-                    disease_dic[d].append(r)
+                    disease_dic[d].extend(r)
             i = 0
             for k, v in disease_dic.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 final_answer += "疾病 {0} 的检查项目有：{1}\n".format(k, ','.join(list(set(v))))
                 i += 1
@@ -270,14 +555,14 @@ class AnswerSearching:
             disease_dic = {}
             for data in answers:
                 d = data['d.name']
-                r = data['n.name']
+                r = as_list(data['n.name'])
                 if d not in disease_dic:
-                    disease_dic[d] = [r]
+                    disease_dic[d] = list(r)
                 else:
-                    disease_dic[d].append(r)
+                    disease_dic[d].extend(r)
             i = 0
             for k, v in disease_dic.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 final_answer += "疾病 {0} 所属科室有：{1}\n".format(k, ','.join(list(set(v))))
                 i += 1
@@ -299,7 +584,7 @@ class AnswerSearching:
                     disease_infos[name].extend([age, insurance, infection, checklist, period, rate, money])
             i = 0
             for k, v in disease_infos.items():
-                if i >= 10:
+                if i >= self.top_num:
                     break
                 message = "疾病 {0} 的描述信息如下：\n发病人群：{1}\n医保：{2}\n传染性：{3}\n检查项目：{4}\n" \
                           "治愈周期：{5}\n治愈率：{6}\n费用：{7}\n"
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import hashlib
+import marshal
+import threading
+from functools import lru_cache
+import jieba
+
+# 每个进程内按用户词典共享的分词器
+_tokenizers = {}
+_lock = threading.Lock()
+
+
+def load_tokenizer(vocab_path, cache_dir):
+    """
+    创建加载了用户词典的分词器。加载用户词典后的前缀词典写入缓存文件，
+    用户词典未变化时直接读取缓存，不再逐行解析词典
+    :param vocab_path: 用户词典
+    :param cache_dir: 缓存目录
+    :return: jieba.Tokenizer
+    """
+    md5 = hashlib.md5(jieba.__version__.encode('utf8'))
+    with open(vocab_path, 'rb') as f:
+        md5.update(f.read())
+    cache_path = os.path.join(cache_dir, 'jieba_{0}.cache'.format(md5.hexdigest()))
+
+    tokenizer = jieba.Tokenizer()
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            tokenizer.FREQ, tokenizer.total = marshal.load(f)
+        tokenizer.initialized = True
+        return tokenizer
+
+    tokenizer.initialize()
+    tokenizer.load_userdict(vocab_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        marshal.dump((tokenizer.FREQ, tokenizer.total), f)
+    os.replace(tmp_path, cache_path)
+    return tokenizer
+
+
+def get_tokenizer(vocab_path, cache_dir):
+    """
+    获取进程内共享的分词器，同一用户词典只初始化一次
+    :param vocab_path: 用户词典
+    :param cache_dir: 缓存目录
+    :return: jieba.Tokenizer
+    """
+    with _lock:
+        tokenizer = _tokenizers.get(vocab_path)
+        if tokenizer is None:
+            tokenizer = load_tokenizer(vocab_path, cache_dir)
+            _tokenizers[vocab_path] = tokenizer
+    return tokenizer
+
+
+def frozen_tokenizer(freq, total):
+    """
+    使用已有前缀词典的分词器，不读取词典文件，也不能再添加词
+    :param freq: 前缀词典，支持 in、[] 和 get，如 bundle.FreqTable
+    :param total: 词频总和
+    :return: jieba.Tokenizer
+    """
+    tokenizer = jieba.Tokenizer()
+    tokenizer.FREQ = freq
+    tokenizer.total = total
+    tokenizer.initialized = True
+    return tokenizer
+
+
+class Segmenter:
+    def __init__(self, vocab_path, cache_dir, cache_size=0, tokenizer=None):
+        """
+        分词器，可选地用 LRU 缓存分词结果
+        :param vocab_path: 用户词典
+        :param cache_dir: 缓存目录
+        :param cache_size: 分词结果缓存条数，0 表示不缓存
+        :param tokenizer: 已构造的分词器，为空时使用进程内共享的分词器
+        """
+        if tokenizer is None:
+            tokenizer = get_tokenizer(vocab_path, cache_dir)
+        self.tokenizer = tokenizer
+        if cache_size:
+            self._cut = lru_cache(maxsize=cache_size)(self._cut)
+
+    def _cut(self, text):
+        return tuple(self.tokenizer.cut(text))
+
+    def cut(self, text):
+        """
+        分词，首尾空白不影响分词结果，以去掉首尾空白后的文本作为缓存键
+        :param text: str
+        :return: tuple(str)
+        """
+        return self._cut(text.strip())
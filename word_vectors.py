@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import threading
+import numpy as np
+
+
+class WordVectors:
+    def __init__(self, store_prefix):
+        """
+        紧凑词向量存储：归一化后的 .npy 矩阵 + 词表索引文件，首次使用时以 mmap 方式打开，
+        多个进程共享同一份物理内存页
+        :param store_prefix: 存储文件前缀，对应 <prefix>.npy 和 <prefix>.vocab
+        """
+        self.vectors_path = store_prefix + '.npy'
+        self.index_path = store_prefix + '.vocab'
+        self._vectors = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        加载词向量存储，文件不存在时视为空存储（相似度计算时跳过余弦分数）
+        :return:
+        """
+        if self._index is not None:
+            return
+        with self._lock:
+            if self._index is None:
+                self._load()
+
+    def _load(self):
+        if not os.path.exists(self.vectors_path) or not os.path.exists(self.index_path):
+            print("词向量存储 {0} 不存在，请先运行 python word_vectors.py 进行转换".format(self.vectors_path))
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._index = {}
+            return
+        with open(self.index_path, 'r', encoding='utf8') as f:
+            index = {w.rstrip('\n'): i for i, w in enumerate(f)}
+        self._vectors = np.load(self.vectors_path, mmap_mode='r')
+        self._index = index
+
+    @property
+    def vectors(self):
+        self.load()
+        return self._vectors
+
+    @property
+    def index(self):
+        self.load()
+        return self._index
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def vector(self, word):
+        """
+        获取归一化后的词向量
+        :param word: str
+        :return: np.ndarray
+        """
+        return self.vectors[self.index[word]]
+
+    def similarity(self, w1, w2):
+        """
+        余弦相似度，与 gensim KeyedVectors.similarity 一致，未登录词抛出 KeyError
+        :param w1: str
+        :param w2: str
+        :return: float
+        """
+        return float(np.dot(self.vector(w1), self.vector(w2)))
+
+
+def convert_word2vec(src_path, store_prefix, vocab_paths):
+    """
+    将 word2vec 文本格式的词向量转换为紧凑存储，只保留词表文件中出现的词
+    :param src_path: word2vec 文本文件
+    :param store_prefix: 输出文件前缀
+    :param vocab_paths: 词表文件列表
+    :return: 保留的词数
+    """
+    wanted = set()
+    for path in vocab_paths:
+        with open(path, 'r', encoding='utf8') as f:
+            wanted.update(w.strip() for w in f if w.strip())
+
+    words = []
+    rows = []
+    with open(src_path, 'r', encoding='utf8', errors='ignore') as f:
+        _, dim = f.readline().split()
+        dim = int(dim)
+        for line in f:
+            word, _, values = line.rstrip().partition(' ')
+            if word not in wanted:
+                continue
+            vec = np.array(values.split(), dtype=np.float32)
+            if vec.shape[0] != dim:
+                continue
+            words.append(word)
+            rows.append(vec)
+            wanted.discard(word)
+
+    vectors = np.vstack(rows) if rows else np.zeros((0, dim), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = (vectors / norms).astype(np.float32)
+
+    np.save(store_prefix + '.npy', vectors)
+    with open(store_prefix + '.vocab', 'w', encoding='utf8') as f:
+        for word in words:
+            f.write(word + '\n')
+    return len(words)
+
+
+if __name__ == "__main__":
+    cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+    data_dir = os.path.join(cur_dir, 'data/')
+    vocab_files = ['vocab.txt', 'disease_vocab.txt', 'alias_vocab.txt', 'symptom_vocab.txt',
+                   'complications_vocab.txt']
+    count = convert_word2vec(os.path.join(data_dir, 'merge_sgns_bigram_char300.txt'),
+                             os.path.join(data_dir, 'word_vectors'),
+                             [os.path.join(data_dir, name) for name in vocab_files])
+    print("已保留词向量：", count)